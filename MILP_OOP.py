@@ -1,12 +1,20 @@
 import numpy as np
-import pandas as pd
+import json
 import os
 import random
-from itertools import product
-from gurobipy import Model, GRB, LinExpr, quicksum
-from operator import itemgetter
-import matplotlib.pyplot as plt
-import plotting
+import sys
+import time
+from collections import deque
+from functools import lru_cache, wraps
+try:
+    import resource
+except ImportError:  # On Windows (no resource module): no peak RSS in the profile
+    resource = None
+try:
+    from gurobipy import Model, GRB, LinExpr, Var, quicksum
+except ImportError:  # MILP_Model needs Gurobi, the matrix backends (backends.py) do not
+    Model = GRB = LinExpr = Var = quicksum = None
+from kinematics import desired_access_times, earliest_access_times, latest_access_times
 
 # usage of no_vehicles vs self.no_vehicles
 
@@ -23,31 +31,23 @@ W = 10
 t_res = 0.5
 # Number of connected vehicles
 no_vehicles = 2 # I dont think should be here
+# Weight of the overtake term JO in the objective
+w_overtake = 0.00001
 
 
-# Maximum number of vehicles
+# Direction classes: vehicles on different axes conflict in the intersection square
+vert_dir = ["North", "South"]
+hor_dir = ["East", "West"]
+
+# Number of vehicles of the default scenario (Vehicle(idx) for idx < max_vehicles)
 max_vehicles = 100
 
-# randomizing
-random.seed(36)
+# Seed of the default scenario (Vehicle(idx) without direction/distance)
+seed = 36
 directions_cars = ['North', 'South', 'East', 'West']
-random_directions = []
-random_distances = []
-
-# the cars spawned can not overlap
-
-for i in range(max_vehicles):
-    random_directions.append(random.choice(directions_cars))
-    while(True):
-        a = random.randrange(5, d_subscription - L)
-        overlap = False
-        for j in range(0, i):
-            if random_directions[i] == random_directions[j]:
-                if (abs(a - random_distances[j]) < 5):
-                    overlap = True
-        if not overlap:
-            random_distances.append(a)
-            break
+# Codes (indices into directions_cars) of the vertical directions
+vert_codes = [directions_cars.index(k) for k in vert_dir]
+
 
 class Vehicle:
     def __init__(self, idx, k=0, d0=-1, v0=20, t0=-1, t_access=None, a_acc=3, a_dec=-4, v_avg=15.63889):
@@ -59,11 +59,11 @@ class Vehicle:
         # Preferred average velocity or road average speed [m/s]
         self.v_avg = v_avg
         if k == 0:
-            self.k = random_directions[idx]
+            self.k = directions_cars[default_spawn()[0][idx]]
         else:
             self.k = k
         if d0 == -1:
-            self.d0 = random_distances[idx]
+            self.d0 = float(default_spawn()[1][idx])
         else:
             self.d0 = d0
         self.v0 = v0
@@ -73,21 +73,286 @@ class Vehicle:
             self.t0 = t0
         self.t_access = t_access
 
+
+def direction_codes(ks):
+    # int8 codes into directions_cars of direction names (codes pass through)
+    ks = np.asarray(ks)
+    if ks.dtype.kind in "iu":
+        codes = ks.astype(np.int8)
+    else:
+        codes = np.full(ks.shape, -1, dtype=np.int8)
+        for code, direction in enumerate(directions_cars):
+            codes[ks == direction] = code
+    if codes.ndim != 1 or np.any((codes < 0) | (codes >= len(directions_cars))):
+        raise ValueError("directions must be one of %s or their index" % directions_cars)
+    return codes
+
+
+def direction_names(codes):
+    # Direction names of direction codes (object array)
+    return np.array(directions_cars, dtype=object)[np.asarray(codes, dtype=int)]
+
+
+def is_vertical(codes):
+    return np.isin(codes, vert_codes)
+
+
+class VehicleBatch:
+    # Struct-of-arrays counterpart of a list of Vehicle: one NumPy array per attribute and the direction as an
+    # int8 code into directions_cars (North, South: vertical). Scalars are broadcast; t0 defaults to d0 / v0.
+    def __init__(self, k, d0, v0=20, t0=None, a_acc=3, a_dec=-4, v_avg=15.63889, idx=None):
+        codes = direction_codes(k)
+        n = len(codes)
+        self.codes = codes
+        self.d0s = np.broadcast_to(np.asarray(d0, dtype=float), n).copy()
+        self.v0s = np.broadcast_to(np.asarray(v0, dtype=float), n).copy()
+        self.t0s = (desired_access_times(self.d0s, self.v0s) if t0 is None
+                    else np.broadcast_to(np.asarray(t0, dtype=float), n).copy())
+        self.a_accs = np.broadcast_to(np.asarray(a_acc, dtype=float), n).copy()
+        self.a_decs = np.broadcast_to(np.asarray(a_dec, dtype=float), n).copy()
+        self.v_avgs = np.broadcast_to(np.asarray(v_avg, dtype=float), n).copy()
+        self.idxs = np.arange(n) if idx is None else np.asarray(idx)
+
+    @classmethod
+    def from_vehicles(cls, vehicles):
+        return cls([vehicle.k for vehicle in vehicles], [vehicle.d0 for vehicle in vehicles],
+                   [vehicle.v0 for vehicle in vehicles], [vehicle.t0 for vehicle in vehicles],
+                   [vehicle.a_max_acc for vehicle in vehicles], [vehicle.a_max_dec for vehicle in vehicles],
+                   [vehicle.v_avg for vehicle in vehicles], [vehicle.idx for vehicle in vehicles])
+
+    def to_vehicles(self):
+        return [self[i] for i in range(len(self))]
+
+    @property
+    def ks(self):
+        return direction_names(self.codes)
+
+    @property
+    def vertical(self):
+        return is_vertical(self.codes)
+
+    @property
+    def nbytes(self):
+        return sum(a.nbytes for a in (self.codes, self.d0s, self.v0s, self.t0s, self.a_accs, self.a_decs,
+                                      self.v_avgs, self.idxs))
+
+    def t_min(self, t_sim=0, v_max=30):
+        return earliest_access_times(self.v0s, self.d0s, self.a_accs, v_max, t_sim)
+
+    def t_max(self, t_sim=0):
+        return latest_access_times(self.v0s, self.d0s, self.a_decs, t_sim)
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+    def __getitem__(self, i):
+        # An int gives a Vehicle, a slice or index array a VehicleBatch
+        if isinstance(i, (int, np.integer)):
+            return Vehicle(int(self.idxs[i]), k=directions_cars[self.codes[i]], d0=float(self.d0s[i]),
+                           v0=float(self.v0s[i]), t0=float(self.t0s[i]), a_acc=float(self.a_accs[i]),
+                           a_dec=float(self.a_decs[i]), v_avg=float(self.v_avgs[i]))
+        return VehicleBatch(self.codes[i], self.d0s[i], self.v0s[i], self.t0s[i], self.a_accs[i], self.a_decs[i],
+                            self.v_avgs[i], self.idxs[i])
+
+
+class ScenarioGenerator:
+    # Random spawn scenarios: directions uniform over the lanes, distances in [d_min, d_max] with at least
+    # `spacing` metres between vehicles of a lane. Per lane, m sorted uniform offsets over the free length
+    # (d_max - d_min - (m-1)*spacing) plus r*spacing for the r-th vehicle give non-overlapping positions in one
+    # pass. Every call starts from `seed`, so the same arguments give the same scenario and no global state changes.
+    def __init__(self, seed=None, d_min=5, d_max=d_subscription - L, spacing=5):
+        self.seed = seed
+        self.d_min = d_min
+        self.d_max = d_max
+        self.spacing = spacing
+
+    def spawn(self, n):
+        # (direction codes into directions_cars, distances) of n vehicles
+        rng = np.random.default_rng(self.seed)
+        codes = rng.integers(0, len(directions_cars), n).astype(np.int8)
+        d0s = np.empty(n)
+        for code in range(len(directions_cars)):
+            lane = np.flatnonzero(codes == code)
+            m = len(lane)
+            free = self.d_max - self.d_min - (m - 1) * self.spacing
+            if m and free < 0:
+                raise ValueError("%d vehicles spaced %g m apart do not fit between %g and %g m"
+                                 % (m, self.spacing, self.d_min, self.d_max))
+            positions = self.d_min + np.sort(rng.uniform(0, free, m)) + np.arange(m) * self.spacing
+            # Lane order independent of the vehicle index
+            d0s[rng.permutation(lane)] = positions
+        return codes, d0s
+
+    def generate(self, n, **kwargs):
+        # VehicleBatch of n spawned vehicles; kwargs (v0, a_acc, ...) go to VehicleBatch
+        codes, d0s = self.spawn(n)
+        return VehicleBatch(codes, d0s, **kwargs)
+
+
+def arrival_stream(n, headway=6, v0=15, seed=0, mix=None):
+    # n vehicles arriving at the intersection with exponential headways [s] on random lanes, so their desired
+    # access times t0 spread over about n * headway seconds; mix: relative weights of North, South, East, West
+    rng = random.Random(seed)
+    vehicles, t = [], 0
+    for i in range(n):
+        t += rng.expovariate(1 / headway)
+        k = rng.choices(directions_cars, weights=mix)[0] if mix is not None else rng.choice(directions_cars)
+        vehicles.append(Vehicle(i, k=k, d0=20 + v0 * t, v0=v0))
+    return vehicles
+
+
+@lru_cache(maxsize=None)
+def default_spawn():
+    # Spawn of the default Vehicle(idx) attributes, made on first use for max_vehicles vehicles
+    return ScenarioGenerator(seed).spawn(max_vehicles)
+
+
+def __getattr__(name):
+    # random_directions / random_distances of the default scenario, built only when asked for
+    if name == "random_directions":
+        return [directions_cars[code] for code in default_spawn()[0]]
+    if name == "random_distances":
+        return default_spawn()[1].tolist()
+    raise AttributeError("module %r has no attribute %r" % (__name__, name))
+
+
+def unpack_vehicles(vehicles):
+    # Vehicles and per-vehicle arrays (ks as direction codes, v0s, d0s, t0s, a_accs, a_decs) of a list of Vehicle
+    # or a VehicleBatch. A list is copied, so a model adding or removing vehicles leaves the caller's list alone.
+    # A VehicleBatch is copied and returned in place of the list, its arrays being the model's arrays: no Vehicle
+    # is made until the model's vehicles are asked for (MILP_Model.vehicles).
+    if isinstance(vehicles, VehicleBatch):
+        batch = vehicles[:]
+        return batch, batch.codes, batch.v0s, batch.d0s, batch.t0s, batch.a_accs, batch.a_decs
+    vehicles = list(vehicles)
+    return (vehicles, direction_codes([vehicle.k for vehicle in vehicles]),
+            *(np.array([getattr(vehicle, name) for vehicle in vehicles], dtype=float)
+              for name in ("v0", "d0", "t0", "a_max_acc", "a_max_dec")))
+
+
+class Solution:
+    # Solution of a MILP_Model: one getAttr("X") over all variables, split by column index into the access times
+    # (array indexed by vehicle), the binary decisions (dicts by pair) and the unweighted objective terms
+    # J1 (latest access time), J2 (sum of |t - t0|) and JO (number of overtakes)
+    def __init__(self, model):
+        milp = model.MILP
+        self.status = milp.Status
+        # Proven optimal within Gurobi's default gap (a larger MIPGap also ends with status OPTIMAL)
+        self.optimal = milp.Status == GRB.OPTIMAL and (not milp.IsMIP or milp.MIPGap <= 1e-4)
+        self.runtime = milp.Runtime
+        self.node_count = milp.NodeCount if milp.IsMIP else 0
+        self.objective = milp.ObjVal if milp.SolCount else None
+        self.mip_gap = milp.MIPGap if milp.IsMIP and milp.SolCount else 0
+        self.variables = milp.getVars()
+        self._milp = milp
+        n = model.no_vehicles
+        if not milp.SolCount:
+            self.values = None
+            self.t = None
+            self.B2, self.B3, self.BO = {}, {}, {}
+            self.J1 = self.J2 = self.JO = None
+            return
+        self.values = np.array(milp.getAttr("X", self.variables), dtype=float)
+        self.t = self.values[[model.t[i].index for i in range(n)]] if n else np.empty(0)
+        self.B2, self.B3, self.BO = (self._binaries(binaries) for binaries in (model.B2, model.B3, model.BO))
+        slack_j1 = model.t_slack.get("slackJ1")
+        self.J1 = float(self.values[slack_j1.index]) if slack_j1 is not None else None
+        self.J2 = float(np.abs(self.t - np.array(model.t0s, dtype=float)).sum())
+        self.JO = sum(self.BO.values())
+
+    def _binaries(self, variables):
+        # pair -> decision of a dict of binary Vars
+        if not variables:
+            return {}
+        values = self.values[[var.index for var in variables.values()]]
+        return dict(zip(variables, (values > 0.5).tolist()))
+
+    def names(self):
+        return self._milp.getAttr("VarName", self.variables)
+
+
+def fcfs_schedule(ks, t_min, t0s, t_gap1, t_gap2, w_2=0.5, fixed=None, lane_order=None):
+    # First-come-first-served schedule in O(n log n): vehicles are taken in order of their target time (t0, or
+    # t_min when deviations from t0 are not penalized) and each is pushed forward until it clears t_gap1 behind
+    # the last vehicle of its lane and t_gap2 behind the last vehicle of the crossing axis.
+    # Vehicles in `fixed` ({index: access time}) keep their time and are served first.
+    # lane_order ({lane code: indices}) keeps that order within each lane: a lane's turn goes to its next vehicle.
+    # ks are direction names or codes.
+    fixed = fixed or {}
+    ks = direction_codes(ks).tolist()
+    vertical = is_vertical(ks).tolist()
+    t_min = np.asarray(t_min, dtype=float)
+    targets = np.maximum(t_min, np.asarray(t0s, dtype=float)) if w_2 > 0 else t_min
+    t = np.empty(len(targets))
+    last_lane = {}
+    last_axis = {True: -np.inf, False: -np.inf}
+    for i, t_fixed in fixed.items():
+        t[i] = t_fixed
+        last_lane[ks[i]] = max(last_lane.get(ks[i], -np.inf), t_fixed)
+        last_axis[vertical[i]] = max(last_axis[vertical[i]], t_fixed)
+    queues = {lane: deque(i for i in order if i not in fixed) for lane, order in (lane_order or {}).items()}
+    for i in np.argsort(targets, kind="stable"):
+        if i in fixed:
+            continue
+        if lane_order is not None:
+            i = queues[ks[i]].popleft()
+        t[i] = max(targets[i], last_lane.get(ks[i], -np.inf) + t_gap1, last_axis[not vertical[i]] + t_gap2)
+        last_lane[ks[i]] = max(last_lane.get(ks[i], -np.inf), t[i])
+        last_axis[vertical[i]] = max(last_axis[vertical[i]], t[i])
+    return t
+
+
+def peak_rss():
+    # Peak resident set size of this process [MB], None where the resource module is missing
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / 2 ** 20 if sys.platform == "darwin" else rss / 2 ** 10  # bytes on macOS, kB on Linux
+
+
+def timed_phase(phase):
+    # Decorator for the MILP_Model phases: wall and CPU time of the call plus the model size (and for optimize
+    # the solver statistics) afterwards, appended to model.profile and written to model.profile_log if set
+    def decorator(method):
+        @wraps(method)
+        def timed(self, *args, **kwargs):
+            wall, cpu = time.perf_counter(), time.process_time()
+            value = method(self, *args, **kwargs)
+            record = {"model": self.name, "phase": phase, "vehicles": self.no_vehicles,
+                      "wall": time.perf_counter() - wall, "cpu": time.process_time() - cpu}
+            record.update(self.model_stats())
+            if phase == "optimize":
+                record.update(status=self.MILP.Status, runtime=self.MILP.Runtime,
+                              node_count=self.MILP.NodeCount if self.MILP.IsMIP else 0,
+                              mip_gap=self.MILP.MIPGap if self.MILP.IsMIP and self.MILP.SolCount else 0,
+                              objective=self.MILP.ObjVal if self.MILP.SolCount else None)
+            record["peak_rss"] = peak_rss()
+            self.profile.append(record)
+            if self.profile_log:
+                with open(self.profile_log, "a") as log:
+                    log.write(json.dumps(record) + "\n")
+            return value
+        return timed
+    return decorator
+
+
 class MILP_Model:
-    def __init__(self, name="milp", vehicles=None, t_sim=0, t_gap1=1, t_gap2=7.5, v_max=30):  # Not good to have default be a list/mutable
+    def __init__(self, name="milp", vehicles=None, t_sim=0, t_gap1=1, t_gap2=7.5, v_max=30, vectorized=False,
+                 tight_big_m=True, lane_order_fixed=False, lazy=False,
+                 window_slack=30, profile_log=None):  # Not good to have default be a list/mutable
+        self.name = name
         self.MILP = Model(name)
         self.MILP.setParam("OutputFlag", 0)
-        self.vehicles = vehicles
         self.t_sim = t_sim
         if vehicles is None:
             vehicles = []
-        self.no_vehicles = len(vehicles)
-        self.ks = [vehicle.k for vehicle in vehicles]  # Direction
-        self.v0s = [vehicle.v0 for vehicle in vehicles]
-        self.d0s = [vehicle.d0 for vehicle in vehicles]
-        self.t0s = [vehicle.t0 for vehicle in vehicles]
-        self.a_accs = [vehicle.a_max_acc for vehicle in vehicles]
-        self.a_decs = [vehicle.a_max_dec for vehicle in vehicles]
+        # A VehicleBatch is accepted as well; the model works on the arrays (ks: direction codes) and self.vehicles
+        # is a list of Vehicle, for a VehicleBatch only made on first use
+        self._vehicles, self.ks, self.v0s, self.d0s, self.t0s, self.a_accs, self.a_decs = unpack_vehicles(vehicles)
+        self.no_vehicles = len(self.ks)
 
         # Safety gap (Headway h) [s] (parallel vehicles, includes safety factor)
         self.t_gap1 = t_gap1  # seconds
@@ -95,73 +360,108 @@ class MILP_Model:
         self.t_gap2 = t_gap2  # seconds
         # Speed limit of the road  [m/s]
         self.v_max = v_max  # m/s
+        # Build the model with bulk matrix calls instead of the per-pair loops (same resulting model)
+        self.vectorized = vectorized
+        # Per-pair big-M from t_min and a schedule horizon instead of the constants 2000 / 1000
+        self.tight_big_m = tight_big_m
+        self.t_horizon = None  # Upper bound on the access times used by the tight big-M
+        # Serve each lane in order of distance: plain precedence rows instead of the B2 and BO binaries
+        self.lane_order_fixed = lane_order_fixed
+        # Leave the C2/C3 rows of pairs with time windows [t_min, max(t_min, t0) + window_slack] more than their
+        # gap apart to a lazy-constraint callback
+        self.lazy = lazy
+        self.window_slack = window_slack
+        self.lazy_pairs = set()  # Pairs (j, k) whose rows are not in the model
+        self.lazy_pending = set()  # Pairs the callback needed in the last solve, added as rows by the next one
+        self.big_m = {}  # big-M used per constraint name
 
         self.t = {}  # access times
         self.t_min = {}  # access times
         self.B2 = {}  # Binary vars for constraint 2
         self.B3 = {}  # Binary vars for constraint 3
+        self.BO = {}  # Binary vars for the overtake term
 
         self.C1 = {}  # Constraint one from the paper
         self.C2 = {}  # Constraint two from the paper
         self.C3 = {}  # Constraint three from the paper
         self.t_slack = {}
         self.obj_constraints = {}
+        self.w_1, self.w_2 = None, None  # Objective weights
+        self.upper_bound = None  # Objective of the heuristic warm start
+        self.phases = set()  # initialize_* phases that have been built
+        self.t_fixed = {}  # Access times fixed to a constant (committed vehicles)
+        self.last_solution = []  # (Var, value) of the last solve, second MIP start of the next one
+        self.result = None  # Solution of the last optimize()
+        self.scenarios = []  # Multi-scenario settings (set_scenarios)
+        # One record per initialize_*/optimize call (see timed_phase); also appended as JSON lines to profile_log,
+        # by default the file named by the MILP_PROFILE environment variable
+        self.profile = []
+        self.profile_log = profile_log if profile_log is not None else os.environ.get("MILP_PROFILE")
 
+    @property
+    def vehicles(self):
+        if isinstance(self._vehicles, VehicleBatch):
+            self._vehicles = self._vehicles.to_vehicles()
+        return self._vehicles
+
+    @timed_phase("variables")
     def initialize_variables(self):
+        self.phases.add("variables")
+        if self.vectorized:
+            return self._initialize_variables_matrix()
         # Access times one per vehicle (+no_vehicles)
         for i in range(self.no_vehicles):
             self.t[i] = self.MILP.addVar(lb=0.0, vtype=GRB.CONTINUOUS, name="t[%d]" % i)
 
-        # Binary variable one per pair of vehicles (constr. 2 & 3) (+ no_vehicles*(no_vehicles-1))
-        for i in range(self.no_vehicles):
-            for j in range(i + 1, self.no_vehicles):
+        # Binary variable one per conflicting pair of vehicles (constr. 2 or 3)
+        for i, j, same in zip(*(a.tolist() for a in self.pair_index())):
+            if same:
                 self.B2[i, j] = self.MILP.addVar(vtype=GRB.BINARY, name="B2[%d,%d]" % (i, j))
+            else:
                 self.B3[i, j] = self.MILP.addVar(vtype=GRB.BINARY, name="B3[%d,%d]" % (i, j))
 
         self.MILP.update()
 
+    @timed_phase("constraints")
     def initialize_constraints(self):
+        self.phases.add("constraints")
+        if self.vectorized:
+            return self._initialize_constraints_matrix()
         # Constraint 1  (+no_vehicles constraints)
+        self.t_min = self.compute_t_mins()
         for i in range(self.no_vehicles):
-            v = np.sqrt(self.v0s[i] ** 2 + 2 * self.a_accs[i] * self.d0s[i])
-            dt1 = (min(self.v_max, v) - self.v0s[i]) / self.a_accs[i]
-            dt2 = max(self.d0s[i] - (self.v_max ** 2 - self.v0s[i] ** 2) / (2 * self.a_accs[i]), 0) / self.v_max
-            self.t_min[i] = self.t_sim + dt1 + dt2
             self.C1[i] = self.MILP.addConstr(self.t[i] >= self.t_min[i], name="C1[%d]" % i)
 
-        # Calculated lower bound value for big M for constraint 2 and 3
-        M_big = 2000
+        # Horizon (upper bound on t) for the big M of constraint 2 and 3
+        self.set_horizon()
 
         # Constraint 2
+        if self.lane_order_fixed:
+            self._add_precedence_constrs()
+        if self.lazy:
+            self.lazy_pairs = set(zip(*(a[self._deferred_mask()].tolist() for a in self.pair_index()[:2])))
+        ks, vertical = self.ks.tolist(), is_vertical(self.ks).tolist()
         for j in range(self.no_vehicles):
             for k in range(j + 1, self.no_vehicles):
-                if self.ks[k] == self.ks[j]:
-                    pair = (j, k)
-                    self.C2[pair] = self.MILP.addConstr(self.t[j] - self.t[k] + M_big * self.B2[j, k] >= self.t_gap1,
-                                                        name="C2[%d,%d]" % (j, k))
-                    pair = (k, j)
-                    self.C2[pair] = self.MILP.addConstr(self.t[k] - self.t[j] + M_big * (1 - self.B2[j, k]) >=
-                                                        self.t_gap1, name="C2[%d,%d]" % (k, j))
+                if ks[k] == ks[j] and not self.lane_order_fixed and (j, k) not in self.lazy_pairs:
+                    self._add_pair_constrs(j, k)
         self.MILP.update()
         # Constraint 3
-        vert_dir = ["North", "South"]
-        hor_dir = ["East", "West"]
         for j in range(self.no_vehicles):
             for k in range(j + 1, self.no_vehicles):
-                if (self.ks[j] in vert_dir and self.ks[k] in hor_dir) or (self.ks[j] in hor_dir
-                                                                          and self.ks[k] in vert_dir):
-                    pair = (j, k)
-                    self.C3[pair] = self.MILP.addConstr(self.t[j] - self.t[k] + M_big * self.B3[j, k] >= self.t_gap2,
-                                                        name="C3[%d,%d]" % (j, k))
-                    pair = (k, j)
-                    self.C3[pair] = self.MILP.addConstr(self.t[k] - self.t[j] + M_big * (1 - self.B3[j, k]) >= self.t_gap2,
-                                                        name="C3[%d,%d]" % (k, j))
+                if vertical[j] != vertical[k] and (j, k) not in self.lazy_pairs:
+                    self._add_pair_constrs(j, k)
 
         self.MILP.update()
 
 
 
+    @timed_phase("objective")
     def initialize_objective_function(self, w_1=0.5, w_2=0.5):
+        self.w_1, self.w_2 = w_1, w_2
+        self.phases.add("objective")
+        if self.vectorized:
+            return self._initialize_objective_function_matrix(w_1, w_2)
         # Adding J1 slack variable (+1 variable)
         self.t_slack["slackJ1"] = self.MILP.addVar(lb=0.0,
                                                    vtype=GRB.CONTINUOUS,
@@ -180,29 +480,25 @@ class MILP_Model:
 
         # Adding J2 Constraints (+2*no_vehicles constraints)
         for i in range(self.no_vehicles):
-            j = 0
-            self.obj_constraints[("constraintsJ2", i)] = \
+            self.obj_constraints[("constraintsJ2pos", i)] = \
                 self.MILP.addConstr(self.t_slack[("slackJ2", i)] >= (self.t[i] - self.t0s[i]),
                                     name="cons_t_access_pos_difference[%d]" % i)
 
-            self.obj_constraints[("constraintsJ2", i + j)] = self.MILP.addConstr(
+            self.obj_constraints[("constraintsJ2neg", i)] = self.MILP.addConstr(
                 self.t_slack[("slackJ2", i)] >= -(self.t[i] - self.t0s[i]),
                 name="cons_t_access_neg_difference[%d]" % i)
-            j += 1
 
-        BO = {}
+        BO = self.BO
+        ks = self.ks.tolist()
         # Overtake Variable
         for i in range(self.no_vehicles):
             for j in range(i + 1, self.no_vehicles):
-                if self.ks[i] == self.ks[j]:
+                if ks[i] == ks[j] and not self.lane_order_fixed:
                     BO[i, j] = self.MILP.addVar(vtype=GRB.BINARY, name="BO[%d,%d]" % (i, j))
 
         # Constraint Overtake
-        for j in range(self.no_vehicles):
-            for k in range(j + 1, self.no_vehicles):
-                if self.ks[j] == self.ks[k]:
-                    self.obj_constraints['cons_Overtake'] = self.MILP.addConstr(self.t[k] - self.t[j]
-                                                        + 1000 * BO[j, k] >= 0, name="cons_over[%d,%d]" % (j, k))
+        for j, k in BO:
+            self._add_overtake_constr(j, k)
         self.MILP.update()
 
         # First term J1
@@ -213,10 +509,8 @@ class MILP_Model:
             j2 += self.t_slack[("slackJ2", i)]
         # Third term JO
         jO = 0
-        for i in range(self.no_vehicles):
-            for j in range(i + 1, self.no_vehicles):
-                if self.ks[i] == self.ks[j]:
-                    jO += BO[i, j]*0.00001
+        for i, j in BO:
+            jO += BO[i, j]*w_overtake
 
         # Define objective function to be MINIMIZED with weights w_1 and w_2
         obj = LinExpr()
@@ -225,17 +519,661 @@ class MILP_Model:
         self.MILP.setObjective(obj, GRB.MINIMIZE)
         self.MILP.update()
 
-    def optimize(self):
-        self.MILP.optimize()
+    #######################################
+    ### Vectorized (matrix API) builder ###
+    #######################################
+    # Same variables, constraints, names and ordering as the loop builder above, but every block is
+    # emitted with a single addMVar/addMConstr call built from NumPy arrays (rows from constraint_blocks and
+    # objective_blocks, which backends.MatrixModel emits as well).
+
+    @staticmethod
+    def _names(prefix, *idx):
+        # Vectorized "prefix[a,b]" formatting
+        names = np.asarray(idx[0]).astype(str).astype(object)
+        for i in idx[1:]:
+            names = names + "," + np.asarray(i).astype(str).astype(object)
+        return (prefix + "[" + names + "]").astype(str)
+
+    def _add_matrix_constrs(self, rows, cols, vals, rhs, names):
+        # scipy is only imported by the vectorized builder, so the solver core imports fast
+        import scipy.sparse as sp
+        if len(rhs) == 0:
+            return []
+        A = sp.csr_matrix((vals, (rows, cols)), shape=(len(rhs), self.MILP.NumVars))
+        return self.MILP.addMConstr(A, None, GRB.GREATER_EQUAL, rhs, name=names.tolist()).tolist()
+
+    def _initialize_variables_matrix(self):
+        n = self.no_vehicles
+        j, k, same = self.pair_index()
+        t = self.MILP.addMVar(n, lb=0.0, vtype=GRB.CONTINUOUS, name=self._names("t", np.arange(n)))
+        self.t = dict(enumerate(t.tolist()))
+
+        # One B2 or B3 per conflicting pair, in pair index order
+        names = np.where(same, self._names("B2", j, k), self._names("B3", j, k))
+        B = self.MILP.addMVar(len(j), vtype=GRB.BINARY, name=names).tolist() if len(j) else []
+        pairs = list(zip(j.tolist(), k.tolist()))
+        self.B2 = {pair: b for pair, b, s in zip(pairs, B, same) if s}
+        self.B3 = {pair: b for pair, b, s in zip(pairs, B, same) if not s}
+        self.MILP.update()
+
+    def _add_blocks(self, blocks):
+        # Add the row blocks of constraint_blocks/objective_blocks, filing the constraints and big-M by key
+        for store, rows, cols, vals, rhs, names, keys, M in blocks:
+            getattr(self, store).update(zip(keys, self._add_matrix_constrs(rows, cols, vals, rhs, names)))
+            if M is not None:
+                self.big_m.update(zip(names.tolist(), M.tolist()))
+
+    def _initialize_constraints_matrix(self):
+        self.t_min = self.compute_t_mins()
+        self.set_horizon()
+        keep = None
+        if self.lazy:
+            j, k, _ = self.pair_index()
+            keep = ~self._deferred_mask()
+            self.lazy_pairs = set(zip(j[~keep].tolist(), k[~keep].tolist()))
+        self._add_blocks(self.constraint_blocks(keep))
+        self.MILP.update()
+
+    def _initialize_objective_function_matrix(self, w_1=0.5, w_2=0.5):
+        n = self.no_vehicles
+        j, k, same = self.pair_index()
+        jj, kk = j[same], k[same]
+        m = len(jj)
+
+        # J1 slack, J2 slacks and overtake binaries, in the loop builder's order
+        base = self.MILP.NumVars
+        self.t_slack["slackJ1"] = self.MILP.addVar(lb=0.0, vtype=GRB.CONTINUOUS, name="slack_delta_t_access")
+        s = self.MILP.addMVar(n, lb=0.0, vtype=GRB.CONTINUOUS,
+                              name=self._names("slack_delta_t_access_abs", np.arange(n))).tolist()
+        self.t_slack.update({("slackJ2", i): var for i, var in enumerate(s)})
+        BO = self.MILP.addMVar(m, vtype=GRB.BINARY, name=self._names("BO", jj, kk)).tolist() if m else []
+        self.BO = dict(zip(zip(jj.tolist(), kk.tolist()), BO))
+        self.MILP.update()
+        self._add_blocks(self.objective_blocks(base))
+        self.MILP.update()
+
+        c = np.zeros(self.MILP.NumVars)
+        c[base] = w_1
+        c[base + 1:base + 1 + n] = w_2
+        c[base + 1 + n:] = w_overtake
+        self.MILP.setMObjective(None, c, 0.0, sense=GRB.MINIMIZE)
+        self.MILP.update()
+
+    def constraint_blocks(self, keep=None):
+        # Rows of C1, the lane_order_fixed precedence rows and C2/C3 in the loop builder's order, for the column
+        # layout of the matrix builders: t[i] in column i, then one binary per pair of pair_index(). Every block
+        # is (store, rows, cols, vals, rhs, names, keys, M) with rows numbered from 0, the keys of the rows in
+        # self.<store> and their big-M (None: no big-M). keep selects the pairs that get C2/C3 rows (lazy mode).
+        # Needs t_min and t_horizon; shared by MILP_Model(vectorized=True) and backends.MatrixModel.
+        n = self.no_vehicles
+        t_min = np.array([self.t_min[i] for i in range(n)], dtype=float)
+        idx = np.arange(n)
+        blocks = [("C1", idx, idx, np.ones(n), t_min, self._names("C1", idx), idx.tolist(), None)]
+        j, k, same = self.pair_index()
+        col_b = n + np.arange(len(j))
+        if keep is None:
+            keep = np.ones(len(j), dtype=bool)
+        if self.lane_order_fixed:
+            # Precedence t[after] - t[before] >= t_gap1, no binary
+            before, after = self.lane_pairs()
+            m = len(before)
+            blocks.append(("C2", np.tile(np.arange(m), 2), np.concatenate([after, before]),
+                           np.concatenate([np.ones(m), -np.ones(m)]), np.full(m, self.t_gap1),
+                           self._names("C2", after, before), list(zip(after.tolist(), before.tolist())), None))
+        for store, mask, gap in (("C2", same & keep, self.t_gap1), ("C3", ~same & keep, self.t_gap2)):
+            jj, kk, bb = j[mask], k[mask], col_b[mask]
+            m = len(jj)
+            if not m:
+                continue
+            # big-M of t_j - t_k >= gap and of t_k - t_j >= gap
+            M0 = gap + self.t_horizon - t_min[jj] if self.tight_big_m else np.full(m, 2000.0)
+            M1 = gap + self.t_horizon - t_min[kk] if self.tight_big_m else np.full(m, 2000.0)
+            # Rows 2q: t_j - t_k + M*B >= gap, rows 2q+1: t_k - t_j - M*B >= gap - M
+            r0, r1 = 2 * np.arange(m), 2 * np.arange(m) + 1
+            rhs = np.empty(2 * m)
+            rhs[r0], rhs[r1] = gap, gap - M1
+            names = np.empty(2 * m, dtype=object)
+            names[r0], names[r1] = self._names(store, jj, kk), self._names(store, kk, jj)
+            M = np.empty(2 * m)
+            M[r0], M[r1] = M0, M1
+            keys = np.empty((2 * m, 2), dtype=int)
+            keys[r0], keys[r1] = np.stack([jj, kk], 1), np.stack([kk, jj], 1)
+            blocks.append((store, np.concatenate([r0, r0, r0, r1, r1, r1]), np.concatenate([jj, kk, bb, kk, jj, bb]),
+                           np.concatenate([np.ones(m), -np.ones(m), M0, np.ones(m), -np.ones(m), -M1]), rhs,
+                           names.astype(str), list(map(tuple, keys.tolist())), M))
+        return blocks
+
+    def objective_blocks(self, col_j1):
+        # J1, J2 and overtake rows (stored in obj_constraints) like constraint_blocks, with the J1 slack in
+        # column col_j1 followed by the n J2 slacks and the BO binaries of the same-lane pairs
+        n = self.no_vehicles
+        t0s = np.asarray(self.t0s, dtype=float)
+        j, k, same = self.pair_index()
+        jj, kk = j[same], k[same]
+        m = len(jj)
+        idx = np.arange(n)
+        col_s, col_bo = col_j1 + 1 + idx, col_j1 + 1 + n + np.arange(m)
+
+        # J1: slack - t[i] >= 0
+        blocks = [("obj_constraints", np.tile(idx, 2), np.concatenate([np.full(n, col_j1), idx]),
+                   np.concatenate([np.ones(n), -np.ones(n)]), np.zeros(n), self._names("cons_t_access", idx),
+                   [("constraintsJ1", i) for i in range(n)], None)]
+        # J2: s[i] - t[i] >= -t0[i] and s[i] + t[i] >= t0[i], interleaved per vehicle
+        r0, r1 = 2 * idx, 2 * idx + 1
+        rhs = np.empty(2 * n)
+        rhs[r0], rhs[r1] = -t0s, t0s
+        names = np.empty(2 * n, dtype=object)
+        names[r0] = self._names("cons_t_access_pos_difference", idx)
+        names[r1] = self._names("cons_t_access_neg_difference", idx)
+        keys = [(tag, i) for i in range(n) for tag in ("constraintsJ2pos", "constraintsJ2neg")]
+        blocks.append(("obj_constraints", np.concatenate([r0, r0, r1, r1]), np.concatenate([col_s, idx, col_s, idx]),
+                       np.concatenate([np.ones(n), -np.ones(n), np.ones(n), np.ones(n)]), rhs, names.astype(str),
+                       keys, None))
+        # Overtake: t[k] - t[j] + M*BO[j,k] >= 0
+        if m:
+            t_min = np.array([self.t_min[i] for i in range(n)], dtype=float)
+            M = self.t_horizon - t_min[kk] if self.tight_big_m else np.full(m, 1000.0)
+            blocks.append(("obj_constraints", np.tile(np.arange(m), 3), np.concatenate([kk, jj, col_bo]),
+                           np.concatenate([np.ones(m), -np.ones(m), M]), np.zeros(m),
+                           self._names("cons_over", jj, kk),
+                           [("cons_Overtake", a, b) for a, b in zip(jj.tolist(), kk.tolist())], M))
+        return blocks
+
+    def compute_t_min(self, i):
+        # Earliest access time: accelerate at a_acc up to v_max, then cruise
+        return float(earliest_access_times(self.v0s[i], self.d0s[i], self.a_accs[i], self.v_max, self.t_sim))
+
+    def compute_t_mins(self):
+        # compute_t_min of every vehicle in one array pass, as a dict like self.t_min
+        t_min = earliest_access_times(self.v0s, self.d0s, self.a_accs, self.v_max, self.t_sim)
+        return dict(enumerate(np.atleast_1d(t_min).tolist()))
+
+    def _pair_family(self, j, k):
+        # Binary, constraint dict, name prefix and gap of conflicting pair (j, k), j < k
+        if (j, k) in self.B2:
+            return self.B2[j, k], self.C2, "C2", self.t_gap1
+        return self.B3[j, k], self.C3, "C3", self.t_gap2
+
+    def _add_pair_constrs(self, j, k):
+        # Constraint 2 or 3 for pair (j, k): B = 0 puts k before j, B = 1 puts j before k
+        B, C, prefix, gap = self._pair_family(j, k)
+        pair = (j, k)
+        M_big = self._big_m(prefix + "[%d,%d]" % pair, j, gap)
+        C[pair] = self.MILP.addConstr(self.t[j] - self.t[k] + M_big * B >= gap, name=prefix + "[%d,%d]" % pair)
+        pair = (k, j)
+        M_big = self._big_m(prefix + "[%d,%d]" % pair, k, gap)
+        C[pair] = self.MILP.addConstr(self.t[k] - self.t[j] + M_big * (1 - B) >= gap, name=prefix + "[%d,%d]" % pair)
+
+    def lane_pairs(self):
+        # Consecutive (before, after) vehicles of every lane when each lane is served in order of distance
+        order = np.lexsort((np.arange(self.no_vehicles), self.d0s, self.ks))
+        same = self.ks[order[:-1]] == self.ks[order[1:]]
+        return order[:-1][same], order[1:][same]
+
+    def lane_order(self):
+        # Service order per lane code in lane_order_fixed mode
+        order = np.argsort(self.d0s, kind="stable")
+        return {lane: order[self.ks[order] == lane].tolist() for lane in np.unique(self.ks).tolist()}
+
+    def _add_precedence_constrs(self):
+        # (Re)build constraint 2 of lane_order_fixed mode from the current lane order
+        self.MILP.remove(list(self.C2.values()))
+        self.C2 = {}
+        for j, k in zip(*(a.tolist() for a in self.lane_pairs())):
+            self.C2[k, j] = self.MILP.addConstr(self.t[k] - self.t[j] >= self.t_gap1, name="C2[%d,%d]" % (k, j))
+
+    def _add_overtake_constr(self, j, k):
+        M_big = self._big_m("cons_over[%d,%d]" % (j, k), k, 0, legacy=1000)
+        self.obj_constraints[("cons_Overtake", j, k)] = self.MILP.addConstr(
+            self.t[k] - self.t[j] + M_big * self.BO[j, k] >= 0, name="cons_over[%d,%d]" % (j, k))
+
+    def horizon(self):
+        # Any idle stretch longer than max(t_gap1, t_gap2) after H0 = max(t_min, t0, fixed times) can be closed by
+        # shifting the later vehicles forward without breaking a gap or increasing J1, J2 or the overtake term.
+        # Hence some optimal schedule ends by H0 + (n-1)*max(t_gap1, t_gap2), which bounds every access time.
+        if self.no_vehicles == 0:
+            return None
+        h0 = max(max(self.t_min.values()), np.max(self.t0s), max(self.t_fixed.values(), default=-np.inf))
+        return h0 + (self.no_vehicles - 1) * max(self.t_gap1, self.t_gap2)
+
+    def set_horizon(self):
+        # Horizon of the current vehicles, and with tight big-M the upper bound of the open access times
+        self.t_horizon = self.horizon()
+        if self.t_horizon is None:
+            return None
+        if self.tight_big_m:
+            free = [var for i, var in self.t.items() if i not in self.t_fixed]
+            self.MILP.setAttr("UB", free, [self.t_horizon] * len(free))
+        return self.t_horizon
+
+    def _big_m(self, name, i, gap, legacy=2000):
+        # Smallest M such that t[i] - t[other] + M >= gap holds for all t[i] >= t_min[i], t[other] <= t_horizon
+        M_big = gap + self.t_horizon - self.t_min[i] if self.tight_big_m else legacy
+        self.big_m[name] = M_big
+        return M_big
+
+    def big_m_report(self, printing=False):
+        # big-M per constraint family (C2, C3, cons_over) and the horizon they were derived from
+        report = {"tight": self.tight_big_m, "horizon": self.t_horizon, "M": dict(self.big_m), "summary": {}}
+        for family in ("C2", "C3", "cons_over"):
+            values = [M for name, M in self.big_m.items() if name.startswith(family + "[")]
+            if values:
+                report["summary"][family] = {"count": len(values), "min": min(values),
+                                             "mean": sum(values) / len(values), "max": max(values)}
+        if printing:
+            print(f"horizon: {self.t_horizon}")
+            print(*(f"{family}: {stats}" for family, stats in report["summary"].items()), sep="\n")
+        return report
+
+    #############################
+    ### Incremental mutations ###
+    #############################
+    # Change the vehicle set of a built model in place, so re-solves reuse the Gurobi model instead of
+    # rebuilding the O(n^2) pair structure.
+
+    def add_vehicle(self, vehicle):
+        # Append a vehicle with its access time, C1, pair binaries, C2/C3 rows and (once the objective exists)
+        # J1/J2 rows and overtake binaries. Returns its index.
+        i = self.no_vehicles
+        self.vehicles.append(vehicle)
+        self.ks = np.concatenate([self.ks, direction_codes([vehicle.k])])
+        for name, value in (("v0s", vehicle.v0), ("d0s", vehicle.d0), ("t0s", vehicle.t0),
+                            ("a_accs", vehicle.a_max_acc), ("a_decs", vehicle.a_max_dec)):
+            setattr(self, name, np.append(getattr(self, name), float(value)))
+        self.no_vehicles += 1
+        ks, vertical = self.ks.tolist(), is_vertical(self.ks).tolist()
+        pairs = [(j, i) for j in range(i) if (ks[j] == ks[i] and not self.lane_order_fixed) or
+                 vertical[j] != vertical[i]]
+
+        if "variables" in self.phases:
+            self.t[i] = self.MILP.addVar(lb=0.0, vtype=GRB.CONTINUOUS, name="t[%d]" % i)
+            for pair in pairs:
+                B = self.B2 if ks[pair[0]] == ks[i] else self.B3
+                B[pair] = self.MILP.addVar(vtype=GRB.BINARY, name=("B2[%d,%d]" if B is self.B2 else "B3[%d,%d]") % pair)
+
+        if "constraints" in self.phases:
+            self.t_min[i] = self.compute_t_min(i)
+            self.C1[i] = self.MILP.addConstr(self.t[i] >= self.t_min[i], name="C1[%d]" % i)
+            self._refresh_big_m()
+            for pair in pairs:
+                self._add_pair_constrs(*pair)
+            if self.lane_order_fixed:
+                self._add_precedence_constrs()
+
+        if "objective" in self.phases:
+            s = self.t_slack[("slackJ2", i)] = self.MILP.addVar(lb=0.0, obj=self.w_2, vtype=GRB.CONTINUOUS,
+                                                               name="slack_delta_t_access_abs[%d]" % i)
+            self.obj_constraints[("constraintsJ1", i)] = self.MILP.addConstr(self.t_slack["slackJ1"] >= self.t[i],
+                                                                             name="cons_t_access[%d]" % i)
+            self.obj_constraints[("constraintsJ2pos", i)] = self.MILP.addConstr(
+                s >= (self.t[i] - self.t0s[i]), name="cons_t_access_pos_difference[%d]" % i)
+            self.obj_constraints[("constraintsJ2neg", i)] = self.MILP.addConstr(
+                s >= -(self.t[i] - self.t0s[i]), name="cons_t_access_neg_difference[%d]" % i)
+            for pair in pairs:
+                if pair in self.B2:
+                    self.BO[pair] = self.MILP.addVar(obj=w_overtake, vtype=GRB.BINARY, name="BO[%d,%d]" % pair)
+                    self._add_overtake_constr(*pair)
+        self.MILP.update()
+        return i
+
+    def remove_vehicle(self, i):
+        # Retire vehicle i and everything attached to it. Vehicles after i move down one index (keys and names).
+        def drop(store):
+            removed = [obj for key, obj in store.items() if i in key]
+            kept = {tuple(a - (a > i) for a in key): obj for key, obj in store.items() if i not in key}
+            return removed, kept
+
+        removed = [self.t.pop(i)] if i in self.t else []
+        removed += [self.C1.pop(i)] if i in self.C1 else []
+        self.t_min.pop(i, None)
+        for name in ("B2", "B3", "BO", "C2", "C3"):
+            gone, kept = drop(getattr(self, name))
+            removed += gone
+            setattr(self, name, kept)
+        # Per-vehicle entries are keyed (tag, i), overtake rows ("cons_Overtake", j, k)
+        obj_constraints, self.obj_constraints = self.obj_constraints, {}
+        for key, c in obj_constraints.items():
+            idx = key[1:]
+            if i in idx:
+                removed.append(c)
+            else:
+                self.obj_constraints[(key[0],) + tuple(a - (a > i) for a in idx)] = c
+        t_slack, self.t_slack = self.t_slack, {}
+        for key, var in t_slack.items():
+            if key != "slackJ1" and key[1] == i:
+                removed.append(var)
+            else:
+                self.t_slack[key if key == "slackJ1" else (key[0], key[1] - (key[1] > i))] = var
+        # Var hashes are model indices, so match removed objects by identity
+        removed_ids = set(map(id, removed))
+        self.last_solution = [(var, x) for var, x in self.last_solution if id(var) not in removed_ids]
+        self.MILP.remove(removed)
+
+        self.t_fixed.pop(i, None)
+        self.t = {a - (a > i): var for a, var in self.t.items()}
+        self.C1 = {a - (a > i): c for a, c in self.C1.items()}
+        self.t_min = {a - (a > i): t for a, t in self.t_min.items()}
+        self.t_fixed = {a - (a > i): t for a, t in self.t_fixed.items()}
+        self.lazy_pairs, self.lazy_pending = ({(j - (j > i), k - (k > i)) for j, k in pairs if i not in (j, k)}
+                                              for pairs in (self.lazy_pairs, self.lazy_pending))
+        del self.vehicles[i]
+        for name in ("ks", "v0s", "d0s", "t0s", "a_accs", "a_decs"):
+            setattr(self, name, np.delete(getattr(self, name), i))
+        self.no_vehicles -= 1
+        self._rename(i)
+        if "constraints" in self.phases:
+            self.big_m = {}
+            self._refresh_big_m(everything=True)
+            if self.lane_order_fixed:
+                self._add_precedence_constrs()
+        self.MILP.update()
+
+    def update_vehicle_state(self, i, d0=None, v0=None, t0=None):
+        # New distance/speed for vehicle i: rewrites its C1 right-hand side, its J2 constants and (tight big-M)
+        # the big-M of its pairs. Only the model's own d0s/v0s/t0s change, the Vehicle objects keep their values.
+        if d0 is not None:
+            self.d0s[i] = d0
+        if v0 is not None:
+            self.v0s[i] = v0
+        self.t0s[i] = t0 if t0 is not None else self.d0s[i] / self.v0s[i]
+        if "constraints" in self.phases:
+            self.t_min[i] = self.compute_t_min(i)
+            self.C1[i].RHS = self.t_min[i]
+            self._refresh_big_m(changed=[i])
+            if self.lane_order_fixed and d0 is not None:
+                self._add_precedence_constrs()
+        if "objective" in self.phases:
+            self.obj_constraints[("constraintsJ2pos", i)].RHS = -self.t0s[i]
+            self.obj_constraints[("constraintsJ2neg", i)].RHS = self.t0s[i]
+        self.MILP.update()
+
+    def fix_vehicle(self, i, t_access):
+        # Commit vehicle i: its access time becomes a constant for every later solve
+        self.t_fixed[i] = t_access
+        self.t[i].LB = self.t[i].UB = t_access
+        if "constraints" in self.phases:
+            self._refresh_big_m(changed=[i])
+        self.MILP.update()
+
+    def set_earliest_time(self, i, t_earliest):
+        # Raise the lower bound of vehicle i (C1) to t_earliest, e.g. the current time in a rolling horizon
+        t_min = max(self.t_min[i], t_earliest)
+        if t_min != self.t_min[i]:
+            self.t_min[i] = t_min
+            self.C1[i].RHS = t_min
+            self._refresh_big_m(changed=[i])
+
+    ##################################
+    ### In-place parameter changes ###
+    ##################################
+    # Parametric re-solves: only objective coefficients, right-hand sides and big-M coefficients change.
+
+    def set_weights(self, w_1, w_2):
+        self.w_1, self.w_2 = w_1, w_2
+        if "objective" in self.phases:
+            self.t_slack["slackJ1"].Obj = w_1
+            slacks = [self.t_slack[("slackJ2", i)] for i in range(self.no_vehicles)]
+            self.MILP.setAttr("Obj", slacks, [w_2] * len(slacks))
+            self.MILP.update()
+
+    def set_gaps(self, t_gap1=None, t_gap2=None):
+        if t_gap1 is not None:
+            self.t_gap1 = t_gap1
+        if t_gap2 is not None:
+            self.t_gap2 = t_gap2
+        if "constraints" in self.phases:
+            self._refresh_big_m(everything=True)
+            if self.lane_order_fixed:
+                self.MILP.setAttr("RHS", list(self.C2.values()), [self.t_gap1] * len(self.C2))
+            self.MILP.update()
+
+    def set_scenarios(self, scenarios):
+        # Gurobi multi-scenario model, one scenario per dict with any of w_1, w_2, t_gap1, t_gap2 (missing: the
+        # current value), solved together by one optimize(). Scenarios may only change objective coefficients and
+        # right-hand sides, so the big-M and horizon of the model as built must cover every scenario: build with
+        # gaps at least as large as any scenario gap.
+        if self.lazy_pairs:
+            raise ValueError("scenarios need every pair row in the model, build without lazy=True")
+        scenarios = [dict(dict(w_1=self.w_1, w_2=self.w_2, t_gap1=self.t_gap1, t_gap2=self.t_gap2), **scenario)
+                     for scenario in scenarios]
+        if any(s["t_gap1"] > self.t_gap1 or s["t_gap2"] > self.t_gap2 for s in scenarios):
+            raise ValueError("scenario gaps must not exceed the gaps the model was built with")
+        self.MILP.NumScenarios = len(scenarios)
+        self.MILP.update()
+        slacks = [self.t_slack[("slackJ2", i)] for i in range(self.no_vehicles)]
+        # Rows (j, k) with j < k have right-hand side gap, rows (k, j) gap - M; lane_order_fixed C2 rows (one per
+        # ordered lane pair, no binary) gap, its C3 rows keep the pair of rows
+        rows, gaps, offsets = [], [], []
+        for C, key in ((self.C2, "t_gap1"), (self.C3, "t_gap2")):
+            for (j, k), constr in C.items():
+                rows.append(constr)
+                gaps.append(key)
+                name = ("C2" if C is self.C2 else "C3") + "[%d,%d]" % (j, k)
+                offsets.append(-self.big_m[name] if j > k and not (C is self.C2 and self.lane_order_fixed) else 0)
+        for number, scenario in enumerate(scenarios):
+            self.MILP.Params.ScenarioNumber = number
+            self.MILP.ScenNName = "scenario%d" % number
+            self.t_slack["slackJ1"].ScenNObj = scenario["w_1"]
+            if slacks:
+                self.MILP.setAttr("ScenNObj", slacks, [scenario["w_2"]] * len(slacks))
+            if rows:
+                self.MILP.setAttr("ScenNRHS", rows, [scenario[gap] + offset for gap, offset in zip(gaps, offsets)])
+        self.MILP.update()
+        self.scenarios = scenarios
+
+    def scenario_results(self):
+        # Objective, bound and access times of every scenario after optimize()
+        results = []
+        t = [self.t[i] for i in range(self.no_vehicles)]
+        for number in range(self.MILP.NumScenarios):
+            self.MILP.Params.ScenarioNumber = number
+            solved = self.MILP.SolCount > 0
+            results.append({"objective": self.MILP.ScenNObjVal if solved else None,
+                            "bound": self.MILP.ScenNObjBound, "status": self.MILP.Status,
+                            "t": self.MILP.getAttr("ScenNX", t) if solved else None})
+        return results
+
+    def clear_scenarios(self):
+        self.MILP.NumScenarios = 0
+        self.MILP.update()
+        self.scenarios = []
+
+    def set_v_max(self, v_max):
+        self.v_max = v_max
+        self._recompute_t_min()
+
+    def set_acceleration(self, a_acc):
+        self.a_accs[:] = a_acc
+        self._recompute_t_min()
+
+    def _recompute_t_min(self):
+        if "constraints" in self.phases:
+            self.t_min = self.compute_t_mins()
+            self.MILP.setAttr("RHS", [self.C1[i] for i in range(self.no_vehicles)],
+                              [self.t_min[i] for i in range(self.no_vehicles)])
+            self._refresh_big_m(everything=True)
+            self.MILP.update()
+
+    def _rename(self, start):
+        # Re-issue the index based names of every variable and constraint that mentions an index >= start
+        items = []
+        items += [(var, "t[%d]" % i) for i, var in self.t.items() if i >= start]
+        items += [(c, "C1[%d]" % i) for i, c in self.C1.items() if i >= start]
+        for prefix in ("B2", "B3", "BO", "C2", "C3"):
+            items += [(obj, prefix + "[%d,%d]" % key) for key, obj in getattr(self, prefix).items()
+                      if max(key) >= start]
+        items += [(var, "slack_delta_t_access_abs[%d]" % key[1]) for key, var in self.t_slack.items()
+                  if key != "slackJ1" and key[1] >= start]
+        names = {"constraintsJ1": "cons_t_access[%d]", "constraintsJ2pos": "cons_t_access_pos_difference[%d]",
+                 "constraintsJ2neg": "cons_t_access_neg_difference[%d]", "cons_Overtake": "cons_over[%d,%d]"}
+        items += [(c, names[key[0]] % key[1:]) for key, c in self.obj_constraints.items() if max(key[1:]) >= start]
+        variables = [(obj, name) for obj, name in items if isinstance(obj, Var)]
+        constraints = [(obj, name) for obj, name in items if not isinstance(obj, Var)]
+        if variables:
+            self.MILP.setAttr("VarName", *map(list, zip(*variables)))
+        if constraints:
+            self.MILP.setAttr("ConstrName", *map(list, zip(*constraints)))
+
+    def _refresh_big_m(self, changed=(), everything=False):
+        # Re-derive the horizon, then rewrite the big-M of every pair if it moved, else only the pairs of `changed`
+        old = self.t_horizon
+        self.set_horizon()
+        everything = everything or old != self.t_horizon
+        for j, k in list(self.B2) + list(self.B3):
+            if (j, k) in self.C2 or (j, k) in self.C3:
+                if everything or j in changed or k in changed:
+                    self._update_pair_big_m(j, k)
+
+    def _update_pair_big_m(self, j, k):
+        B, C, prefix, gap = self._pair_family(j, k)
+        M_big = self._big_m(prefix + "[%d,%d]" % (j, k), j, gap)
+        self.MILP.chgCoeff(C[j, k], B, M_big)
+        C[j, k].RHS = gap
+        M_big = self._big_m(prefix + "[%d,%d]" % (k, j), k, gap)
+        self.MILP.chgCoeff(C[k, j], B, -M_big)
+        C[k, j].RHS = gap - M_big
+        if ("cons_Overtake", j, k) in self.obj_constraints:
+            M_big = self._big_m("cons_over[%d,%d]" % (j, k), k, 0, legacy=1000)
+            self.MILP.chgCoeff(self.obj_constraints[("cons_Overtake", j, k)], self.BO[j, k], M_big)
+
+    def pair_index(self):
+        # Conflicting pairs (j < k) in loop order and whether they share a lane (B2, constr. 2) or cross (B3,
+        # constr. 3). Opposite-direction pairs (North/South, East/West) never conflict and get no binary, nor do
+        # same-lane pairs when the lane order is fixed.
+        j, k = np.triu_indices(self.no_vehicles, 1)
+        same = self.ks[j] == self.ks[k]
+        vertical = is_vertical(self.ks)
+        cross = vertical[j] != vertical[k]
+        conflict = cross if self.lane_order_fixed else same | cross
+        return j[conflict], k[conflict], same[conflict]
+
+    def _deferred_mask(self):
+        # Pairs of pair_index() whose time windows are more than their gap apart (fixed vehicles: their time)
+        j, k, same = self.pair_index()
+        lo = np.array([self.t_min[i] for i in range(self.no_vehicles)], dtype=float)
+        hi = np.maximum(lo, np.array(self.t0s, dtype=float)) + self.window_slack
+        for i, t_fixed in self.t_fixed.items():
+            lo[i] = hi[i] = t_fixed
+        gap = np.where(same, self.t_gap1, self.t_gap2)
+        return (lo[k] >= hi[j] + gap) | (lo[j] >= hi[k] + gap)
+
+    def _callback(self, model, where):
+        # Stop at the deadline; on a new incumbent add the violated lazy rows, or else stream it to on_incumbent
+        if self._deadline is not None and time.perf_counter() > self._deadline:
+            model.terminate()
+        if where != GRB.Callback.MIPSOL:
+            return
+        t = np.array(model.cbGetSolution([self.t[i] for i in range(self.no_vehicles)]))
+        if self.lazy_pairs and self._lazy_callback(model, t):
+            return
+        objective = model.cbGet(GRB.Callback.MIPSOL_OBJ)
+        if self._on_incumbent is not None and objective < self._best_streamed:
+            self._best_streamed = objective
+            self._on_incumbent(t, objective, model.cbGet(GRB.Callback.RUNTIME))
+
+    def _lazy_callback(self, model, t):
+        # Add the rows of every deferred pair that the incumbent t violates; True if it did (t is rejected)
+        j, k, gap = self._lazy_arrays
+        violated = np.flatnonzero(~self._lazy_added & (np.abs(t[j] - t[k]) < gap - 1e-6))
+        for q in violated.tolist():
+            a, b = int(j[q]), int(k[q])
+            B, _, prefix, gap_ab = self._pair_family(a, b)
+            model.cbLazy(self.t[a] - self.t[b] + self._big_m(prefix + "[%d,%d]" % (a, b), a, gap_ab) * B >= gap_ab)
+            model.cbLazy(self.t[b] - self.t[a] + self._big_m(prefix + "[%d,%d]" % (b, a), b, gap_ab) * (1 - B)
+                         >= gap_ab)
+            self._lazy_added[q] = True
+            self.lazy_pending.add((a, b))
+        return len(violated) > 0
+
+    def warm_start(self):
+        # Feed the FCFS schedule to Gurobi as MIP start (access times, consistent pair binaries and slacks).
+        # Its objective is kept as upper bound on the optimum.
+        n = self.no_vehicles
+        t = fcfs_schedule(self.ks, [self.t_min[i] for i in range(n)], self.t0s, self.t_gap1, self.t_gap2,
+                          w_2=self.w_2 if self.w_2 is not None else 0.5, fixed=self.t_fixed,
+                          lane_order=self.lane_order() if self.lane_order_fixed else None)
+        start = {self.t[i]: t[i] for i in range(n)}
+        # B2/B3[j,k] = 1 releases t[j] - t[k] >= gap, i.e. k goes after j; BO[j,k] = 1 when k overtakes j
+        start.update({B: float(t[k] > t[j]) for B2B3 in (self.B2, self.B3) for (j, k), B in B2B3.items()})
+        start.update({B: float(t[k] < t[j]) for (j, k), B in self.BO.items()})
+        deviation = np.abs(t - np.array(self.t0s, dtype=float))
+        if "slackJ1" in self.t_slack:
+            start[self.t_slack["slackJ1"]] = t.max(initial=0)
+            start.update({self.t_slack[("slackJ2", i)]: deviation[i] for i in range(n)})
+        # Start 0 is the FCFS schedule, start 1 the previous solution (if any) after in-place changes
+        previous = self.last_solution
+        self.MILP.NumStart = 2 if previous else 1
+        self.MILP.update()
+        self.MILP.params.StartNumber = 0
+        self.MILP.setAttr("Start", list(start), list(start.values()))
+        if previous:
+            self.MILP.params.StartNumber = 1
+            self.MILP.setAttr("Start", *map(list, zip(*previous)))
+        if self.w_1 is not None:
+            self.upper_bound = (self.w_1 * t.max(initial=0) + self.w_2 * deviation.sum()
+                                + w_overtake * sum(t[k] < t[j] for j, k in self.BO))
+        return t
+
+    @timed_phase("optimize")
+    def optimize(self, warm_start=True, time_budget=None, mip_gap=None, on_incumbent=None):
+        # Latency budget: with time_budget [s] of wall-clock time (counted from this call) and/or an acceptable
+        # mip_gap the solve stops early and returns the best schedule found; on_incumbent(t, objective, runtime)
+        # gets every improving incumbent as it is found. result.optimal tells whether optimality was proven.
+        self._deadline = time.perf_counter() + time_budget if time_budget is not None else None
+        self._on_incumbent = on_incumbent
+        self._best_streamed = np.inf
+        # Pairs the callback needed last time become ordinary rows (adding them earlier would discard the solution)
+        for j, k in sorted(self.lazy_pending & self.lazy_pairs):
+            self.lazy_pairs.discard((j, k))
+            self._add_pair_constrs(j, k)
+        self.lazy_pending = set()
+        heuristic = self.warm_start() if warm_start and self.no_vehicles else None
+        if self.lazy_pairs:
+            pairs = sorted(self.lazy_pairs)
+            self._lazy_arrays = (np.array([j for j, _ in pairs]), np.array([k for _, k in pairs]),
+                                 np.array([self._pair_family(j, k)[3] for j, k in pairs]))
+            self._lazy_added = np.zeros(len(pairs), dtype=bool)
+            self.MILP.Params.LazyConstraints = 1
+        # The budget settings only hold for this solve
+        params = {"TimeLimit": max(self._deadline - time.perf_counter(), 0) if self._deadline is not None else None,
+                  "MIPGap": mip_gap}
+        previous = {name: self.MILP.getParamInfo(name)[2] for name, value in params.items() if value is not None}
+        for name in previous:
+            self.MILP.setParam(name, params[name])
+        try:
+            if self.lazy_pairs or self._deadline is not None or on_incumbent is not None:
+                self.MILP.optimize(self._callback)
+            else:
+                self.MILP.optimize()
+        finally:
+            for name, value in previous.items():
+                self.MILP.setParam(name, value)
+        self.result = self.solution()
+        if self.MILP.SolCount:
+            self.last_solution = list(zip(self.result.variables, self.result.values.tolist()))
+        elif heuristic is not None and self.MILP.Status in (GRB.TIME_LIMIT, GRB.INTERRUPTED):
+            # Out of time before Gurobi took the MIP start: answer with the FCFS schedule itself
+            self.result.t, self.result.objective = heuristic, self.upper_bound
+
+    def model_stats(self):
+        # Size of the model as built so far
+        self.MILP.update()
+        return {"variables": self.MILP.NumVars, "binaries": self.MILP.NumBinVars,
+                "constraints": self.MILP.NumConstrs, "nonzeros": self.MILP.NumNZs}
+
+    def solution(self):
+        # Solution of the current solve, read with a single bulk X fetch
+        return Solution(self)
 
     def getvariables(self, printing=False, only_t=False):
-        # Get the values of all the decision variables
-        solution = {}
-        for i in self.MILP.getVars():
-            if only_t and i.VarName.startswith('t'):
-                solution[i.VarName] = i.X
-            elif not only_t:
-                solution[i.VarName] = i.X
+        # Get the values of all the decision variables (name -> value view of solution()); empty without an
+        # incumbent (e.g. a time budget that ran out before the first solution)
+        result = self.solution()
+        if result.values is None:
+            return {}
+        names = result.names()
+        solution = {name: value for name, value in zip(names, result.values.tolist())
+                    if not only_t or name.startswith('t')}
         if printing:
             print(*(f"{name}: {solution[name]}" for name in solution), sep="\n")
         return solution
@@ -248,11 +1186,12 @@ class MILP_Model:
         return print(self.MILP)
 
     def plot_access_times(self):
-        solution = self.getvariables()
-        t_access = [solution[name] for name in solution if name.startswith('t')]
+        # The plotting stack is only imported here, so the solver imports fast and works without a display
+        import plotting
+        t_access = self.solution().t.tolist()
 
         plotting.plot_vehicle_position(self.vehicles)
-        plotting.plot_access_times(self.ks, t_access, self.t0s, signals=True)
+        plotting.plot_access_times(direction_names(self.ks), t_access, self.t0s, signals=True)
 
 
 # Generating 10 default vehicles
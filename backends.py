@@ -0,0 +1,160 @@
+import time
+import numpy as np
+import scipy.sparse as sp
+from scipy.optimize import milp, LinearConstraint, Bounds
+from MILP_OOP import MILP_Model, unpack_vehicles, w_overtake
+
+#######################
+### Matrix backends ###
+#######################
+# The intersection model of MILP_Model (vectorized builder: same variables, rows, names and order, the rows from
+# the same constraint_blocks/objective_blocks) emitted as sparse matrices, min c x s.t. A x >= rhs,
+# lb <= x <= ub, and solved by any of the `backends`: SciPy/HiGHS needs no license and no gurobipy, Gurobi gets
+# the same matrices through its matrix API.
+
+# Gurobi status codes for the scipy.optimize.milp statuses, so results of both backends compare directly
+highs_status = {0: 2, 1: 9, 2: 3, 3: 5, 4: 12}
+
+
+class MatrixModel:
+    # MILP_Model call sequence and inputs; optimize(backend=...) fills t[i] (floats) and stats
+    compute_t_min = MILP_Model.compute_t_min
+    compute_t_mins = MILP_Model.compute_t_mins
+    vehicles = MILP_Model.vehicles
+    pair_index = MILP_Model.pair_index
+    lane_pairs = MILP_Model.lane_pairs
+    horizon = MILP_Model.horizon
+    constraint_blocks = MILP_Model.constraint_blocks
+    objective_blocks = MILP_Model.objective_blocks
+    _names = staticmethod(MILP_Model._names)
+
+    def __init__(self, name="matrix", vehicles=None, t_sim=0, t_gap1=1, t_gap2=7.5, v_max=30, tight_big_m=True,
+                 lane_order_fixed=False):
+        self.name = name
+        self.t_sim = t_sim
+        if vehicles is None:
+            vehicles = []
+        self._vehicles, self.ks, self.v0s, self.d0s, self.t0s, self.a_accs, self.a_decs = unpack_vehicles(vehicles)
+        self.no_vehicles = len(self.ks)
+        self.t_gap1 = t_gap1
+        self.t_gap2 = t_gap2
+        self.v_max = v_max
+        self.tight_big_m = tight_big_m
+        self.lane_order_fixed = lane_order_fixed
+
+        # Columns: bounds, integrality, objective and names; rows: (rows, cols, vals) blocks with their rhs/names
+        self.lb, self.ub, self.integrality, self.c, self.var_names = [], [], [], [], []
+        self.blocks, self.rhs, self.constr_names = [], [], []
+        self.t_min = {}
+        self.t_fixed = {}  # No committed vehicles (read by horizon)
+        self.t_horizon = None
+        self.w_1, self.w_2 = None, None
+        self.t = {}  # access times, after optimize()
+        self.stats = {}  # objective, status (Gurobi codes), runtime, node_count, mip_gap of the last solve
+
+    @property
+    def num_vars(self):
+        return sum(map(len, self.lb))
+
+    def _add_vars(self, n, lb=0.0, ub=np.inf, integer=False, obj=0.0, names=()):
+        first = self.num_vars
+        self.lb.append(np.full(n, lb, dtype=float))
+        self.ub.append(np.full(n, ub, dtype=float))
+        self.integrality.append(np.full(n, int(integer)))
+        self.c.append(np.full(n, obj, dtype=float))
+        self.var_names.extend(names)
+        return first + np.arange(n)
+
+    def _add_rows(self, rows, cols, vals, rhs, names):
+        offset = sum(map(len, self.rhs))
+        self.blocks.append((np.asarray(rows) + offset, np.asarray(cols), np.asarray(vals, dtype=float)))
+        self.rhs.append(np.asarray(rhs, dtype=float))
+        self.constr_names.extend(np.asarray(names).tolist())
+
+    def initialize_variables(self):
+        n = self.no_vehicles
+        j, k, same = self.pair_index()
+        self.col_t = self._add_vars(n, names=self._names("t", np.arange(n)).tolist() if n else [])
+        names = np.where(same, self._names("B2", j, k), self._names("B3", j, k)).tolist() if len(j) else []
+        self.col_b = self._add_vars(len(j), ub=1.0, integer=True, names=names)
+
+    def initialize_constraints(self):
+        self.t_min = self.compute_t_mins()
+        self.t_horizon = self.horizon()
+        if self.tight_big_m and self.no_vehicles:
+            self.ub[0][:] = self.t_horizon
+        for _, rows, cols, vals, rhs, names, _, _ in self.constraint_blocks():
+            self._add_rows(rows, cols, vals, rhs, names)
+
+    def initialize_objective_function(self, w_1=0.5, w_2=0.5):
+        self.w_1, self.w_2 = w_1, w_2
+        n = self.no_vehicles
+        j, k, same = self.pair_index()
+        jj, kk = j[same], k[same]
+        m = len(jj)
+        col_j1 = self._add_vars(1, obj=w_1, names=["slack_delta_t_access"])[0]
+        self._add_vars(n, obj=w_2, names=self._names("slack_delta_t_access_abs", np.arange(n)).tolist())
+        self._add_vars(m, ub=1.0, integer=True, obj=w_overtake, names=self._names("BO", jj, kk).tolist())
+        for _, rows, cols, vals, rhs, names, _, _ in self.objective_blocks(col_j1):
+            self._add_rows(rows, cols, vals, rhs, names)
+
+    def matrices(self):
+        # (c, A, rhs, lb, ub, integrality) of min c x s.t. A x >= rhs
+        rhs = np.concatenate(self.rhs) if self.rhs else np.empty(0)
+        if self.blocks:
+            rows, cols, vals = (np.concatenate(a) for a in zip(*self.blocks))
+        else:
+            rows, cols, vals = np.empty(0, dtype=int), np.empty(0, dtype=int), np.empty(0)
+        A = sp.csr_matrix((vals, (rows, cols)), shape=(len(rhs), self.num_vars))
+        return (np.concatenate(self.c), A, rhs, np.concatenate(self.lb), np.concatenate(self.ub),
+                np.concatenate(self.integrality))
+
+    def optimize(self, backend="highs", time_limit=None, mip_gap=None, threads=None):
+        x, self.stats = backends[backend](self, time_limit=time_limit, mip_gap=mip_gap, threads=threads)
+        if x is not None:
+            self.t = {i: float(x[col]) for i, col in enumerate(self.col_t)}
+        return self.stats
+
+
+def solve_highs(model, time_limit=None, mip_gap=None, threads=None):
+    # scipy.optimize.milp (HiGHS); it has no thread setting, so `threads` is ignored
+    c, A, rhs, lb, ub, integrality = model.matrices()
+    options = {"disp": False}
+    if time_limit is not None:
+        options["time_limit"] = time_limit
+    if mip_gap is not None:
+        options["mip_rel_gap"] = mip_gap
+    constraints = [LinearConstraint(A, rhs, np.inf)] if A.shape[0] else []
+    start = time.perf_counter()
+    result = milp(c, constraints=constraints, integrality=integrality, bounds=Bounds(lb, ub), options=options)
+    runtime = time.perf_counter() - start
+    stats = {"objective": result.fun if result.x is not None else None,
+             "status": highs_status.get(result.status, 12), "runtime": runtime,
+             "node_count": getattr(result, "mip_node_count", 0) or 0,
+             "mip_gap": getattr(result, "mip_gap", 0) or 0}
+    return result.x, stats
+
+
+def solve_gurobi(model, time_limit=None, mip_gap=None, threads=None):
+    # Gurobi matrix API; imported here so the other backends work without gurobipy
+    from gurobipy import Model, GRB
+    c, A, rhs, lb, ub, integrality = model.matrices()
+    solver = Model(model.name)
+    solver.setParam("OutputFlag", 0)
+    for param, value in (("TimeLimit", time_limit), ("MIPGap", mip_gap), ("Threads", threads)):
+        if value is not None:
+            solver.setParam(param, value)
+    x = solver.addMVar(len(c), lb=lb, ub=ub, obj=c, vtype=np.where(integrality == 1, GRB.BINARY, GRB.CONTINUOUS),
+                       name=model.var_names)
+    if A.shape[0]:
+        solver.addMConstr(A, x, GRB.GREATER_EQUAL, rhs, name=model.constr_names)
+    solver.ModelSense = GRB.MINIMIZE
+    solver.optimize()
+    is_mip = solver.IsMIP
+    stats = {"objective": solver.ObjVal if solver.SolCount else None, "status": solver.Status,
+             "runtime": solver.Runtime, "node_count": solver.NodeCount if is_mip else 0,
+             "mip_gap": solver.MIPGap if is_mip and solver.SolCount else 0}
+    return (x.X if solver.SolCount else None), stats
+
+
+backends = {"highs": solve_highs, "gurobi": solve_gurobi}
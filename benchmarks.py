@@ -0,0 +1,276 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+from MILP_OOP import MILP_Model, ScenarioGenerator, Vehicle, arrival_stream
+from backends import MatrixModel
+from cache import ResultCache
+from sensitivity import run_sweep
+from dp_scheduler import DPScheduler
+from platoon import PlatoonModel
+
+##################
+### Benchmarks ###
+##################
+
+
+def lazy_benchmark(sizes=(50, 100, 200), headway=6, window_slack=30, time_limit=60, printing=True):
+    # Model size and solve time of the eager model against lazy mode (rows of far-apart pairs via callback)
+    results = []
+    for n in sizes:
+        for lazy in (False, True):
+            example = MILP_Model("lazy" if lazy else "eager", arrival_stream(n, headway), lazy=lazy,
+                                 window_slack=window_slack)
+            start = time.perf_counter()
+            example.initialize_variables()
+            example.initialize_constraints()
+            example.initialize_objective_function()
+            build_time = time.perf_counter() - start
+            # The model size is known before the solve, so the row reduction is reported even if the solve fails
+            record = {"vehicles": n, "lazy": lazy, "variables": example.MILP.NumVars,
+                      "constraints": example.MILP.NumConstrs, "deferred": len(example.lazy_pairs),
+                      "build_time": build_time}
+            example.MILP.setParam("TimeLimit", time_limit)
+            try:
+                example.optimize()
+                record.update(cut=len(example.lazy_pending), objective=example.result.objective,
+                              status=example.MILP.Status, runtime=example.MILP.Runtime)
+            except Exception as error:  # e.g. the size limit of a restricted Gurobi license
+                record["error"] = str(error)
+            results.append(record)
+            if printing:
+                print(results[-1])
+    return results
+
+
+def backend_benchmark(sizes=(10, 15, 20, 30, 45, 60), backends=("gurobi", "highs"), lane_order_fixed=False,
+                      time_limit=60, printing=True):
+    # Solve time of the same matrix model on each backend (default spawned vehicles)
+    results = []
+    for n in sizes:
+        for backend in backends:
+            example = MatrixModel(backend, [Vehicle(i) for i in range(n)], lane_order_fixed=lane_order_fixed)
+            example.initialize_variables()
+            example.initialize_constraints()
+            example.initialize_objective_function()
+            try:
+                stats = example.optimize(backend, time_limit=time_limit)
+            except Exception as error:  # e.g. the size limit of a restricted Gurobi license
+                stats = {"error": str(error)}
+            results.append(dict(stats, vehicles=n, backend=backend, variables=example.num_vars))
+            if printing:
+                print(results[-1])
+    return results
+
+
+#########################
+### Scaling benchmark ###
+#########################
+# Build, solve and extraction time plus memory of every engine against the number of vehicles, for several
+# direction mixes and t_gap2 values (sensitivity.py sweeps t_gap2 over [0, 15]). Results are JSON records keyed
+# by (engine, vehicles, mix, t_gap2), so a run can be compared against a stored baseline (regression mode).
+
+# Engine name -> (model class, constructor options)
+engines = {"loop": (MILP_Model, {}),
+           "vectorized": (MILP_Model, {"vectorized": True}),
+           "lane_order_fixed": (MILP_Model, {"lane_order_fixed": True}),
+           "lazy": (MILP_Model, {"lazy": True}),
+           "highs": (MatrixModel, {}),
+           "dp_heuristic_shift3": (DPScheduler, {"max_shift": 3}),
+           "platoon": (PlatoonModel, {})}
+
+# Relative weights of North, South, East, West
+direction_mixes = {"uniform": (1, 1, 1, 1), "main_road": (3, 3, 1, 1), "one_way": (4, 0, 1, 0)}
+
+
+def run_engine(engine, vehicles, t_gap2=7.5, time_limit=10, memory=True):
+    # One build, solve and extraction of `engine`; times [s], solver statistics and memory [MB]. The times come
+    # from an untraced run, as tracing slows the builders several times over. With memory=True a second, traced
+    # run gives the peak traced (Python and numpy) allocation of the run alone, so engines run in one process are
+    # comparable; memory held inside the solver libraries is not traced.
+    cls, options = engines[engine]
+    record = _run_engine(cls, options, engine, vehicles, t_gap2, time_limit)
+    if memory:
+        record["peak_memory"] = traced_peak(_run_engine, cls, options, engine, vehicles, t_gap2, time_limit)
+    return record
+
+
+def traced_peak(function, *args):
+    # Peak memory [MB] allocated by function(*args) above what was allocated before the call
+    tracing = tracemalloc.is_tracing()
+    if tracing:
+        tracemalloc.reset_peak()
+    else:
+        tracemalloc.start()
+    try:
+        memory = tracemalloc.get_traced_memory()[0]
+        function(*args)
+        return (tracemalloc.get_traced_memory()[1] - memory) / 2 ** 20
+    finally:
+        if not tracing:
+            tracemalloc.stop()
+
+
+def _run_engine(cls, options, engine, vehicles, t_gap2, time_limit):
+    start = time.perf_counter()
+    model = cls(engine, vehicles, t_gap2=t_gap2, **options)
+    model.initialize_variables()
+    model.initialize_constraints()
+    model.initialize_objective_function()
+    build_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    if cls is MatrixModel:
+        stats = model.optimize("highs", time_limit=time_limit)
+        objective, status = stats["objective"], stats["status"]
+    elif cls is DPScheduler:
+        objective, status = model.optimize(), model.status
+    else:
+        model.MILP.setParam("TimeLimit", time_limit)
+        model.optimize()
+        objective = model.MILP.ObjVal if model.MILP.SolCount else None
+        status = model.MILP.Status
+    solve_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    if cls is MILP_Model:
+        t = model.solution().t
+    elif cls is PlatoonModel:
+        t = np.array([model.t_access[i] for i in range(model.no_vehicles)]) if model.t_access else None
+    else:
+        t = np.array([model.t[i] for i in range(model.no_vehicles)]) if model.t else None
+    extraction_time = time.perf_counter() - start
+    return {"build_time": build_time, "solve_time": solve_time, "extraction_time": extraction_time,
+            "objective": objective, "status": status, "solved": t is not None}
+
+
+def scaling_benchmark(sizes=(5, 10, 20, 50, 100, 200), mixes=("uniform", "main_road", "one_way"),
+                      t_gap2s=(2.5, 7.5, 12.5), engine_names=tuple(engines), headway=6, seed=0, time_limit=10,
+                      output=None, printing=True, memory=True):
+    # One record per (engine, vehicles, mix, t_gap2); written as JSON to `output` if given. memory=False skips the
+    # traced run of every engine (no peak_memory)
+    results = []
+    for n in sizes:
+        for mix in mixes:
+            vehicles = arrival_stream(n, headway, seed=seed, mix=direction_mixes[mix])
+            for t_gap2 in t_gap2s:
+                for engine in engine_names:
+                    record = {"engine": engine, "vehicles": n, "mix": mix, "t_gap2": t_gap2}
+                    try:
+                        record.update(run_engine(engine, vehicles, t_gap2, time_limit, memory))
+                    except Exception as error:  # e.g. the size limit of a restricted Gurobi license
+                        record["error"] = str(error)
+                    results.append(record)
+                    if printing:
+                        print(record)
+    if output is not None:
+        with open(output, "w") as file:
+            json.dump(results, file, indent=1)
+    return results
+
+
+def find_regressions(results, baseline, tolerance=1.5, min_time=0.05, min_memory=1.0,
+                     metrics=("build_time", "solve_time", "extraction_time", "peak_memory")):
+    # Records of `results` above tolerance * baseline in any metric (+ min_time [s] for times, + min_memory [MB] for
+    # peak_memory, against measurement noise), or failing where the baseline ran; baseline is a list of records or
+    # the path of a saved run. Metrics missing from the baseline (older runs) are skipped.
+    if isinstance(baseline, str):
+        with open(baseline) as file:
+            baseline = json.load(file)
+    def key(record):
+        return record["engine"], record["vehicles"], record["mix"], record["t_gap2"]
+
+    reference = {key(record): record for record in baseline}
+    regressions = []
+    for record in results:
+        base = reference.get(key(record))
+        if base is None or "error" in base:
+            continue
+        if "error" in record:
+            regressions.append(dict(record, metric="error"))
+            continue
+        for metric in metrics:
+            if base.get(metric) is None:
+                continue
+            margin = min_memory if metric == "peak_memory" else min_time
+            if record[metric] > tolerance * base[metric] + margin:
+                regressions.append(dict(record, metric=metric, baseline=base[metric],
+                                        slowdown=record[metric] / base[metric] if base[metric] else np.inf))
+    return regressions
+
+
+##########################
+### Overhead benchmark ###
+##########################
+# Wall-clock times the unit tests only check for behaviour, each against the limit it is meant to stay under.
+
+
+def overhead_benchmark(printing=True):
+    # Records (name, time [s], limit [s], within) of: importing the solver core in a fresh headless interpreter,
+    # spawning 1e5 vehicles, a sweep answered from the result cache and a solve with a 0.3 s latency budget
+    results = []
+
+    def record(name, elapsed, limit):
+        results.append({"name": name, "time": elapsed, "limit": limit, "within": elapsed <= limit})
+        if printing:
+            print(results[-1])
+
+    script = "import time; start = time.perf_counter(); import MILP_OOP; print(time.perf_counter() - start)"
+    env = {name: value for name, value in os.environ.items() if name not in ("DISPLAY", "MPLBACKEND")}
+    output = subprocess.run([sys.executable, "-c", script], cwd=os.path.dirname(os.path.abspath(__file__)),
+                            env=env, capture_output=True, text=True, check=True).stdout
+    record("import", float(output.split()[-1]), 1.0)
+
+    start = time.perf_counter()
+    ScenarioGenerator(seed=3, d_max=1e6).generate(100000, v0=15)
+    record("spawn_1e5", time.perf_counter() - start, 0.5)
+
+    points = [dict(vehicles=6, tgap2=tgap2) for tgap2 in (5, 7.5, 10)]
+    with tempfile.TemporaryDirectory() as directory:
+        cache = ResultCache(os.path.join(directory, "cache.sqlite"))
+        run_sweep(points, workers=1, cache=cache)
+        start = time.perf_counter()
+        run_sweep(points, workers=1, cache=cache)
+        record("cached_sweep", time.perf_counter() - start, 0.5)
+        cache.close()
+
+    example = MILP_Model("budget", arrival_stream(40, headway=3))
+    example.initialize_variables()
+    example.initialize_constraints()
+    example.initialize_objective_function()
+    start = time.perf_counter()
+    example.optimize(time_budget=0.3)
+    record("time_budget_0.3", time.perf_counter() - start, 0.6)
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Performance benchmarks of the intersection scheduling models")
+    parser.add_argument("benchmark", nargs="?", default="scaling", choices=("scaling", "lazy", "backend", "overhead"))
+    parser.add_argument("--sizes", type=int, nargs="+", default=[5, 10, 20, 50, 100, 200])
+    parser.add_argument("--engines", nargs="+", default=list(engines), choices=list(engines))
+    parser.add_argument("--time-limit", type=float, default=10)
+    parser.add_argument("--output", help="write the scaling results (JSON) to this file")
+    parser.add_argument("--baseline", help="regression mode: compare against this saved scaling run")
+    parser.add_argument("--tolerance", type=float, default=1.5)
+    parser.add_argument("--no-memory", action="store_true", help="skip the traced run measuring peak memory")
+    args = parser.parse_args()
+    if args.benchmark == "lazy":
+        lazy_benchmark()
+    elif args.benchmark == "backend":
+        backend_benchmark()
+    elif args.benchmark == "overhead":
+        sys.exit(0 if all(record["within"] for record in overhead_benchmark()) else 1)
+    else:
+        results = scaling_benchmark(args.sizes, engine_names=args.engines, time_limit=args.time_limit,
+                                    output=args.output, memory=not args.no_memory)
+        if args.baseline:
+            regressions = find_regressions(results, args.baseline, args.tolerance)
+            for regression in regressions:
+                print("REGRESSION", regression)
+            sys.exit(1 if regressions else 0)
@@ -0,0 +1,73 @@
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+#####################################
+### Persistent result memoization ###
+#####################################
+# On-disk cache of solved cases, keyed by a hash of the vehicle set and the model parameters. Entries hold the
+# objective, status, solve time and access times; the least recently used entries are evicted beyond max_entries.
+
+default_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results_cache.sqlite")
+
+
+class ResultCache:
+    def __init__(self, path=default_path, max_entries=100000):
+        self.path = path
+        self.max_entries = max_entries
+        self._connection = None
+
+    # The sqlite connection is opened lazily, so the cache can be handed to pool workers
+    def __getstate__(self):
+        return {"path": self.path, "max_entries": self.max_entries, "_connection": None}
+
+    @property
+    def connection(self):
+        if self._connection is None:
+            self._connection = sqlite3.connect(self.path, timeout=60)
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("CREATE TABLE IF NOT EXISTS results "
+                                     "(key TEXT PRIMARY KEY, value TEXT, last_used REAL)")
+        return self._connection
+
+    @staticmethod
+    def key(vehicles, seed=None, **params):
+        # vehicles: Vehicle objects; params: w1, w2, tgap1, tgap2, vmax, backend (any model or solver parameter)
+        data = {"vehicles": [[vehicle.k, float(vehicle.d0), float(vehicle.v0), float(vehicle.a_max_acc)]
+                             for vehicle in vehicles],
+                "seed": seed,
+                "params": {name: value if isinstance(value, str) else float(value)
+                           for name, value in sorted(params.items())}}
+        return hashlib.sha256(json.dumps(data, sort_keys=True).encode()).hexdigest()
+
+    def get(self, key):
+        row = self.connection.execute("SELECT value FROM results WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        with self.connection:
+            self.connection.execute("UPDATE results SET last_used = ? WHERE key = ?", (time.time(), key))
+        return json.loads(row[0])
+
+    def put(self, key, result):
+        # result: dict with objective, status, runtime and t (list of access times)
+        with self.connection:
+            self.connection.execute("INSERT OR REPLACE INTO results VALUES (?, ?, ?)",
+                                    (key, json.dumps(result), time.time()))
+            excess = len(self) - self.max_entries
+            if excess > 0:
+                self.connection.execute("DELETE FROM results WHERE key IN "
+                                        "(SELECT key FROM results ORDER BY last_used LIMIT ?)", (excess,))
+
+    def __len__(self):
+        return self.connection.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+
+    def clear(self):
+        with self.connection:
+            self.connection.execute("DELETE FROM results")
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
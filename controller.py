@@ -0,0 +1,149 @@
+import time
+import numpy as np
+from MILP_OOP import MILP_Model, vert_dir
+from kinematics import earliest_access_times, latest_access_times
+
+############################################
+### Rolling-horizon intersection control ###
+############################################
+# Keeps one MILP_Model alive while simulated time advances: arriving vehicles are added, vehicles inside the
+# commit distance get their access time fixed, vehicles that crossed (and can no longer constrain anybody) are
+# removed, and the open vehicles are re-optimized every `resolve_every` steps.
+
+
+class IntersectionController:
+    def __init__(self, t_gap1=1, t_gap2=7.5, v_max=30, w_1=0.5, w_2=0.5, dt=0.5, resolve_every=2,
+                 commit_distance=50, time_limit=None, time_budget=None):
+        self.model = MILP_Model("rolling_horizon", [], t_gap1=t_gap1, t_gap2=t_gap2, v_max=v_max)
+        self.model.initialize_variables()
+        self.model.initialize_constraints()
+        self.model.initialize_objective_function(w_1=w_1, w_2=w_2)
+        if time_limit is not None:
+            self.model.MILP.setParam("TimeLimit", time_limit)
+        # Simulation step [s]
+        self.dt = dt
+        # Re-optimize every resolve_every steps
+        self.resolve_every = resolve_every
+        # Vehicles closer than this to the intersection [m] keep their access time
+        self.commit_distance = commit_distance
+        # Wall-clock budget of a re-optimization [s]: the best schedule found by then is used
+        self.time_budget = time_budget
+
+        self.t_sim = 0
+        self.steps = 0
+        # Per model index: arrival time and current access time (None until the first solve)
+        self.t_arrival = []
+        self.t_access = []
+        self.served = []  # (vehicle, access time) of the vehicles that left the model
+        self.served_arrivals = []  # Arrival time of every served vehicle (check_schedule(..., t_sim=...))
+        self.cumulative_delay = 0  # Sum of t_access - t0 over served vehicles
+        self.history = []  # One record per step
+
+    def arrive(self, vehicle):
+        # vehicle.d0 is its distance at the current time and vehicle.t0 its desired travel time from now; only the
+        # model's own t0 becomes the absolute target time, the Vehicle keeps its values
+        self.model.t_sim = self.t_sim
+        i = self.model.add_vehicle(vehicle)
+        self.model.update_vehicle_state(i, t0=self.t_sim + vehicle.t0)
+        self.t_arrival.append(self.t_sim)
+        self.t_access.append(None)
+
+    def remaining_distance(self, i):
+        # Distance to the intersection assuming the vehicle covers its planned trip at constant average speed
+        t_access, t_arrival = self.t_access[i], self.t_arrival[i]
+        if t_access is None:
+            return self.model.d0s[i]
+        if t_access <= self.t_sim or t_access <= t_arrival:
+            return 0
+        return self.model.d0s[i] * (t_access - self.t_sim) / (t_access - t_arrival)
+
+    def solve(self):
+        start = time.perf_counter()
+        self.model.optimize(time_budget=self.time_budget)
+        latency = time.perf_counter() - start
+        if self.model.MILP.SolCount:
+            self.t_access = self.model.result.t.tolist()
+        return latency
+
+    def step(self, arrivals=()):
+        self.t_sim += self.dt
+        self.steps += 1
+        for vehicle in arrivals:
+            self.arrive(vehicle)
+
+        # Freeze vehicles inside the commit distance, keep the open ones from being scheduled in the past
+        frozen = 0
+        for i in range(self.model.no_vehicles):
+            if i in self.model.t_fixed:
+                continue
+            if self.t_access[i] is not None and self.remaining_distance(i) <= self.commit_distance:
+                self.model.fix_vehicle(i, self.t_access[i])
+                frozen += 1
+            else:
+                self.model.set_earliest_time(i, self.t_sim)
+
+        # Retire crossed vehicles once no open vehicle can be within a safety gap of them
+        retired = 0
+        clearance = max(self.model.t_gap1, self.model.t_gap2)
+        for i in reversed(range(self.model.no_vehicles)):
+            if i in self.model.t_fixed and self.t_access[i] + clearance <= self.t_sim:
+                self.served.append((self.model.vehicles[i], self.t_access[i]))
+                self.served_arrivals.append(self.t_arrival[i])
+                self.cumulative_delay += self.t_access[i] - self.model.t0s[i]
+                self.model.remove_vehicle(i)
+                del self.t_arrival[i], self.t_access[i]
+                retired += 1
+
+        solve_time = None
+        n_open = self.model.no_vehicles - len(self.model.t_fixed)
+        if n_open and (self.steps % self.resolve_every == 0 or None in self.t_access):
+            solve_time = self.solve()
+
+        record = {"t_sim": self.t_sim, "vehicles": self.model.no_vehicles, "open": n_open,
+                  "frozen": frozen, "retired": retired, "solve_time": solve_time,
+                  "cumulative_delay": self.cumulative_delay}
+        self.history.append(record)
+        return record
+
+    def run(self, arrivals, duration):
+        # arrivals: (arrival time, Vehicle) pairs sorted by arrival time
+        arrivals = list(arrivals)
+        nxt = 0
+        while self.t_sim < duration:
+            batch = []
+            while nxt < len(arrivals) and arrivals[nxt][0] <= self.t_sim + self.dt:
+                batch.append(arrivals[nxt][1])
+                nxt += 1
+            self.step(batch)
+        return self.summary()
+
+    def summary(self):
+        latencies = [record["solve_time"] for record in self.history if record["solve_time"] is not None]
+        return {"t_sim": self.t_sim, "steps": self.steps, "served": len(self.served),
+                "in_model": self.model.no_vehicles, "solves": len(latencies),
+                "mean_solve_time": sum(latencies) / len(latencies) if latencies else 0,
+                "max_solve_time": max(latencies, default=0),
+                "max_vehicles": max((record["vehicles"] for record in self.history), default=0),
+                "cumulative_delay": self.cumulative_delay}
+
+
+def check_schedule(served, t_gap1, t_gap2, tol=1e-6, v_max=None, t_sim=0):
+    # True if the served access times respect t_gap1 within a lane and t_gap2 between crossing axes and, given
+    # v_max, lie between the earliest (full acceleration) and latest (full braking) access time seen from t_sim.
+    # t_sim is one time for all vehicles or one per served vehicle (e.g. IntersectionController.served_arrivals).
+    if v_max is not None and served:
+        t_sim = np.asarray(t_sim, dtype=float)
+        vehicles = [vehicle for vehicle, _ in served]
+        t = np.array([t_access for _, t_access in served], dtype=float)
+        v0s, d0s = [vehicle.v0 for vehicle in vehicles], [vehicle.d0 for vehicle in vehicles]
+        t_min = earliest_access_times(v0s, d0s, [vehicle.a_max_acc for vehicle in vehicles], v_max, t_sim)
+        t_max = latest_access_times(v0s, d0s, [vehicle.a_max_dec for vehicle in vehicles], t_sim)
+        if np.any(t < t_min - tol) or np.any(t > t_max + tol):
+            return False
+    for a, (vehicle_a, t_a) in enumerate(served):
+        for vehicle_b, t_b in served[a + 1:]:
+            if vehicle_a.k == vehicle_b.k and abs(t_a - t_b) < t_gap1 - tol:
+                return False
+            if (vehicle_a.k in vert_dir) != (vehicle_b.k in vert_dir) and abs(t_a - t_b) < t_gap2 - tol:
+                return False
+    return True
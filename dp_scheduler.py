@@ -0,0 +1,195 @@
+import time
+import numpy as np
+from scipy.optimize import linprog
+from MILP_OOP import MILP_Model, direction_codes, unpack_vehicles, vert_codes, vert_dir, hor_dir, w_overtake
+
+#################################################
+### Dynamic-programming scheduler (heuristic) ###
+#################################################
+# Alternative engine for the MILP_Model problem without branch-and-bound. Every lane is a FIFO queue (ordered
+# by target time, like fcfs_schedule), so a schedule is an interleaving of the four queues. The DP walks over
+# the queue positions (pN, pS, pE, pW) and the axis served last. Once the other axis has been served, only the
+# ready times of the two lanes of the current axis matter (for t_gap2 >= t_gap1 / 2), so a label holds those
+# two times and the J2 cost so far, and only Pareto-optimal labels are kept per state.
+# Each vehicle is served either as early as possible or at its target time; the best order found is then
+# re-timed exactly with an LP. Only with w_2 = 0 and the full DP is this the MILP optimum (up to the w_overtake
+# term, status OPTIMAL); otherwise it is a heuristic upper bound (status SUBOPTIMAL): the MILP can also pull a
+# vehicle to an intermediate time for the sake of a later one, which changes the best order (on random 10-vehicle
+# instances with w_2 > 0 about one schedule in ten costs more than the MILP optimum, by up to 9%).
+# The full DP has O(n^4) states (seconds at 50 vehicles). max_shift restricts every vehicle to within max_shift
+# positions of its FCFS position (constrained position shifting), which bounds the states per step and makes the
+# DP linear in the number of vehicles, at a further loss of optimality.
+
+# Lane codes, vertical first
+lanes = direction_codes(vert_dir + hor_dir).tolist()
+
+# Gurobi status codes reported by DPScheduler.status
+OPTIMAL, SUBOPTIMAL = 2, 13
+
+
+class DPScheduler:
+    # Same inputs and call sequence as MILP_Model; t[i] holds the access times as floats after optimize()
+    compute_t_min = MILP_Model.compute_t_min
+    compute_t_mins = MILP_Model.compute_t_mins
+    vehicles = MILP_Model.vehicles
+
+    def __init__(self, name="dp_heuristic", vehicles=None, t_sim=0, t_gap1=1, t_gap2=7.5, v_max=30, max_shift=None):
+        if 2 * t_gap2 < t_gap1:
+            raise ValueError("DPScheduler needs t_gap2 >= t_gap1 / 2")
+        self.name = name
+        self.t_sim = t_sim
+        if vehicles is None:
+            vehicles = []
+        self._vehicles, self.ks, self.v0s, self.d0s, self.t0s, self.a_accs, self.a_decs = unpack_vehicles(vehicles)
+        self.no_vehicles = len(self.ks)
+        self.t_gap1 = t_gap1
+        self.t_gap2 = t_gap2
+        self.v_max = v_max
+        # Maximum deviation from the FCFS position (None: full DP)
+        self.max_shift = max_shift
+
+        self.t = {}  # access times
+        self.t_min = {}
+        self.w_1, self.w_2 = None, None
+        self.order = []  # Service order of the best schedule
+        self.objective = None
+        self.status = None  # OPTIMAL if the schedule is provably optimal (exact), else SUBOPTIMAL
+        self.runtime = None
+        self.labels = 0  # Labels kept over all states of the last solve
+
+    def initialize_variables(self):
+        pass
+
+    def initialize_constraints(self):
+        self.t_min = self.compute_t_mins()
+
+    def initialize_objective_function(self, w_1=0.5, w_2=0.5):
+        self.w_1, self.w_2 = w_1, w_2
+
+    def optimize(self):
+        start = time.perf_counter()
+        if len(self.t_min) != self.no_vehicles:
+            self.initialize_constraints()
+        if self.w_1 is None:
+            self.initialize_objective_function()
+        n = self.no_vehicles
+        t_min = np.array([self.t_min[i] for i in range(n)], dtype=float)
+        t0s = np.array(self.t0s, dtype=float)
+        targets = np.maximum(t_min, t0s) if self.w_2 > 0 else t_min
+        fcfs = np.argsort(targets, kind="stable")
+        rank = np.empty(n, dtype=int)
+        rank[fcfs] = np.arange(n)
+        queues = [[i for i in fcfs.tolist() if self.ks[i] == lane] for lane in lanes]
+        lengths = tuple(len(queue) for queue in queues)
+        # Access time candidates: as early as possible, or not before the target
+        candidates = [(t_min[i], targets[i]) if targets[i] > t_min[i] else (t_min[i],) for i in range(n)]
+        shift = n if self.max_shift is None else self.max_shift
+
+        # state: (queue positions, axis served last) -> labels (ready time of the two axis lanes, J2 cost, parent)
+        # with axis 0 vertical (lanes 0, 1) and 1 horizontal (lanes 2, 3)
+        states = {((0, 0, 0, 0), 0): [(-np.inf, -np.inf, 0.0, None)],
+                  ((0, 0, 0, 0), 1): [(-np.inf, -np.inf, 0.0, None)]}
+        self.labels = 2
+        for m in range(n):
+            successors = {}
+            for (position, axis), labels in states.items():
+                for l in range(4):
+                    if position[l] == lengths[l]:
+                        continue
+                    i = queues[l][position[l]]
+                    if abs(rank[i] - m) > shift:
+                        continue
+                    nxt = position[:l] + (position[l] + 1,) + position[l + 1:]
+                    # The queue heads left behind must still be servable within the shift window
+                    if any(nxt[q] < lengths[q] and rank[queues[q][nxt[q]]] < m + 1 - shift for q in range(4)):
+                        continue
+                    lane_axis, side = divmod(l, 2)
+                    new = successors.setdefault((nxt, lane_axis), [])
+                    for label in labels:
+                        if lane_axis == axis:
+                            ready = label[side]
+                            other = label[1 - side]
+                        else:
+                            # Switching axis: both lanes wait t_gap2 after the last vehicle of the other axis
+                            ready = other = max(label[0], label[1]) - self.t_gap1 + self.t_gap2
+                        for t in candidates[i]:
+                            t = max(t, ready)
+                            times = (t + self.t_gap1, other) if side == 0 else (other, t + self.t_gap1)
+                            new.append(times + (label[2] + self.w_2 * abs(t - t0s[i]), (label, i)))
+            states = {state: pareto(labels) for state, labels in successors.items()}
+            self.labels += sum(len(labels) for labels in states.values())
+
+        best, best_cost = None, np.inf
+        for (position, axis), labels in states.items():
+            for label in labels:
+                cost = self.w_1 * (max(label[0], label[1]) - self.t_gap1) + label[2]
+                if cost < best_cost:
+                    best, best_cost = label, cost
+        self.order = []
+        while best is not None and best[3] is not None:
+            best, i = best[3]
+            self.order.append(i)
+        self.order.reverse()
+        t = self.retime(self.order, t_min, t0s) if n else np.empty(0)
+        self.t = {i: t[i] for i in range(n)}
+
+        # Overtakes are counted against the vehicle index like the BO variables of MILP_Model
+        overtakes = sum(t[k] < t[j] for j in range(n) for k in range(j + 1, n) if self.ks[j] == self.ks[k])
+        self.objective = (self.w_1 * t.max(initial=0) + self.w_2 * np.abs(t - t0s).sum()
+                          + w_overtake * overtakes)
+        self.status = OPTIMAL if self.exact else SUBOPTIMAL
+        self.runtime = time.perf_counter() - start
+        return self.objective
+
+    @property
+    def exact(self):
+        # The DP is exact only without J2 cost and without a shift window
+        return self.w_2 == 0 and self.max_shift is None
+
+    def retime(self, order, t_min, t0s):
+        # Optimal access times for a fixed service order: LP in t, the makespan z and the J2 slacks s
+        n = len(order)
+        rows, rhs = [], []
+        last = {}  # lane -> vehicle served last in that lane
+        for k in order:
+            for lane, j in last.items():
+                if lane == self.ks[k]:
+                    gap = self.t_gap1
+                elif (lane in vert_codes) != (self.ks[k] in vert_codes):
+                    gap = self.t_gap2
+                else:
+                    continue
+                rows.append({j: 1, k: -1})  # t[j] - t[k] <= -gap
+                rhs.append(-gap)
+            last[self.ks[k]] = k
+        for i in range(n):
+            rows.append({i: 1, n: -1})  # t[i] <= z
+            rhs.append(0)
+            rows.append({i: 1, n + 1 + i: -1})  # t[i] - t0 <= s
+            rhs.append(t0s[i])
+            rows.append({i: -1, n + 1 + i: -1})  # t0 - t[i] <= s
+            rhs.append(-t0s[i])
+        A = np.zeros((len(rows), 2 * n + 1))
+        for r, row in enumerate(rows):
+            for col, value in row.items():
+                A[r, col] = value
+        c = np.concatenate([np.zeros(n), [self.w_1], np.full(n, self.w_2)])
+        bounds = [(t_min[i], None) for i in range(n)] + [(None, None)] + [(0, None)] * n
+        result = linprog(c, A_ub=A, b_ub=rhs, bounds=bounds, method="highs")
+        return result.x[:n]
+
+    def getvariables(self, printing=False, only_t=False):
+        # Same names as the t variables of MILP_Model
+        solution = {"t[%d]" % i: self.t[i] for i in range(self.no_vehicles)}
+        if printing:
+            print(*(f"{name}: {solution[name]}" for name in solution), sep="\n")
+        return solution
+
+
+def pareto(labels):
+    # Labels not dominated in (ready times, cost): later ready times or a higher cost never help later on
+    kept = []
+    for label in sorted(labels, key=lambda label: (label[2], label[0] + label[1])):
+        if not any(other[0] <= label[0] and other[1] <= label[1] for other in kept):
+            kept.append(label)
+    return kept
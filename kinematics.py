@@ -0,0 +1,55 @@
+import numpy as np
+
+##################
+### Kinematics ###
+##################
+# Access time bounds of whole vehicle arrays at once (scalars broadcast). A vehicle at distance d0 [m] with
+# speed v0 [m/s] reaches the intersection at the earliest by accelerating at a_acc up to v_max and cruising,
+# and at the latest by braking at a_dec (< 0) all the way, which is only a bound while it cannot stop in front
+# of the intersection (d0 below its stopping distance).
+
+
+def _arrays(*values):
+    return np.broadcast_arrays(*(np.asarray(value, dtype=float) for value in values))
+
+
+def desired_access_times(d0s, v0s, t_sim=0):
+    # Access time when keeping the current speed
+    d0s, v0s = _arrays(d0s, v0s)
+    return t_sim + d0s / v0s
+
+
+def reachable_speeds(v0s, d0s, a_accs, v_max):
+    # Speed at the intersection when accelerating at a_acc over d0, capped at v_max
+    v0s, d0s, a_accs = _arrays(v0s, d0s, a_accs)
+    return np.minimum(v_max, np.sqrt(v0s ** 2 + 2 * a_accs * d0s))
+
+
+def acceleration_times(v0s, d0s, a_accs, v_max):
+    v0s, d0s, a_accs = _arrays(v0s, d0s, a_accs)
+    return (reachable_speeds(v0s, d0s, a_accs, v_max) - v0s) / a_accs
+
+
+def cruise_times(v0s, d0s, a_accs, v_max):
+    # Time at v_max over the distance left after the acceleration phase
+    v0s, d0s, a_accs = _arrays(v0s, d0s, a_accs)
+    return np.maximum(d0s - (v_max ** 2 - v0s ** 2) / (2 * a_accs), 0) / v_max
+
+
+def earliest_access_times(v0s, d0s, a_accs, v_max, t_sim=0):
+    # t_min of constraint 1
+    return t_sim + acceleration_times(v0s, d0s, a_accs, v_max) + cruise_times(v0s, d0s, a_accs, v_max)
+
+
+def stopping_distances(v0s, a_decs):
+    v0s, a_decs = _arrays(v0s, a_decs)
+    return v0s ** 2 / (-2 * a_decs)
+
+
+def latest_access_times(v0s, d0s, a_decs, t_sim=0):
+    # Access time when braking at a_dec from now on; inf for vehicles that can stop before the intersection
+    v0s, d0s, a_decs = _arrays(v0s, d0s, a_decs)
+    discriminant = v0s ** 2 + 2 * a_decs * d0s
+    can_stop = discriminant <= 0
+    t = (v0s - np.sqrt(np.where(can_stop, 0, discriminant))) / -a_decs
+    return t_sim + np.where(can_stop, np.inf, t)
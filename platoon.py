@@ -0,0 +1,155 @@
+import numpy as np
+from gurobipy import Model, GRB
+from MILP_OOP import MILP_Model, is_vertical, unpack_vehicles
+
+###########################
+### Platoon aggregation ###
+###########################
+# Same-lane vehicles only a few metres apart cross back to back anyway, so they are scheduled as one unit:
+# platoon p with members r = 0..m-1 (in lane order) crosses at T[p] + r*t_gap1. Same-lane platoons keep their
+# lane order (precedence rows), crossing platoons get one binary per pair, so the binary count drops roughly
+# with the platoon size. Opposite directions never conflict, as in MILP_Model.
+
+
+def form_platoons(ks, d0s, max_spacing=30, max_size=None):
+    # Vehicle indices per platoon: consecutive vehicles of a lane (by distance) at most max_spacing [m] apart
+    platoons = []
+    for lane in sorted(set(ks)):
+        order = sorted((i for i in range(len(ks)) if ks[i] == lane), key=lambda i: (d0s[i], i))
+        for i in order:
+            last = platoons[-1] if platoons else None
+            if (last is not None and ks[last[-1]] == lane and d0s[i] - d0s[last[-1]] <= max_spacing
+                    and (max_size is None or len(last) < max_size)):
+                last.append(i)
+            else:
+                platoons.append([i])
+    return platoons
+
+
+class PlatoonModel:
+    # MILP over platoons with the MILP_Model call sequence; t_access holds the expanded per-vehicle times
+    compute_t_min = MILP_Model.compute_t_min
+    compute_t_mins = MILP_Model.compute_t_mins
+    vehicles = MILP_Model.vehicles
+    horizon = MILP_Model.horizon
+
+    def __init__(self, name="platoon", vehicles=None, t_sim=0, t_gap1=1, t_gap2=7.5, v_max=30, max_spacing=30,
+                 max_size=None):
+        self.MILP = Model(name)
+        self.MILP.setParam("OutputFlag", 0)
+        self.t_sim = t_sim
+        if vehicles is None:
+            vehicles = []
+        self._vehicles, self.ks, self.v0s, self.d0s, self.t0s, self.a_accs, self.a_decs = unpack_vehicles(vehicles)
+        self.no_vehicles = len(self.ks)
+        self.t_gap1 = t_gap1
+        self.t_gap2 = t_gap2
+        self.v_max = v_max
+
+        self.platoons = form_platoons(self.ks, self.d0s, max_spacing, max_size)
+        # Time from the leader to the last member of every platoon
+        self.duration = [(len(members) - 1) * t_gap1 for members in self.platoons]
+        self.T = {}  # Access time of the platoon leaders
+        self.t_min = {}  # Per vehicle
+        self.T_min = {}  # Per platoon
+        self.t_fixed = {}  # No committed vehicles (read by horizon)
+        self.B3 = {}  # Binary per crossing pair of platoons
+        self.C1, self.C2, self.C3 = {}, {}, {}
+        self.t_slack = {}
+        self.t_horizon = None
+        self.t_access = {}  # Per vehicle, after optimize()
+
+    def crossing_pairs(self):
+        axis = is_vertical([self.ks[members[0]] for members in self.platoons]).tolist()
+        return [(p, q) for p in range(len(self.platoons)) for q in range(p + 1, len(self.platoons))
+                if axis[p] != axis[q]]
+
+    def initialize_variables(self):
+        for p in range(len(self.platoons)):
+            self.T[p] = self.MILP.addVar(lb=0.0, vtype=GRB.CONTINUOUS, name="T[%d]" % p)
+        for p, q in self.crossing_pairs():
+            self.B3[p, q] = self.MILP.addVar(vtype=GRB.BINARY, name="B3[%d,%d]" % (p, q))
+        self.MILP.update()
+
+    def initialize_constraints(self):
+        self.t_min = self.compute_t_mins()
+        # Constraint 1: every member r reaches the intersection no earlier than its own t_min
+        for p, members in enumerate(self.platoons):
+            self.T_min[p] = max(self.t_min[i] - r * self.t_gap1 for r, i in enumerate(members))
+            self.C1[p] = self.MILP.addConstr(self.T[p] >= self.T_min[p], name="C1[%d]" % p)
+
+        # Horizon of MILP_Model, the platoon schedule is one of the vehicle schedules
+        self.t_horizon = self.horizon()
+        for p in self.T:
+            self.T[p].UB = self.t_horizon
+
+        # Constraint 2: consecutive platoons of a lane keep their order
+        for p in range(len(self.platoons) - 1):
+            q = p + 1
+            if self.ks[self.platoons[p][0]] == self.ks[self.platoons[q][0]]:
+                self.C2[q, p] = self.MILP.addConstr(self.T[q] - self.T[p] >= self.duration[p] + self.t_gap1,
+                                                    name="C2[%d,%d]" % (q, p))
+        # Constraint 3: B = 0 puts q (entirely) before p, B = 1 puts p before q
+        for p, q in self.crossing_pairs():
+            B = self.B3[p, q]
+            gap = self.t_gap2 + self.duration[q]
+            M_big = gap + self.t_horizon - self.T_min[p]
+            self.C3[p, q] = self.MILP.addConstr(self.T[p] - self.T[q] + M_big * B >= gap, name="C3[%d,%d]" % (p, q))
+            gap = self.t_gap2 + self.duration[p]
+            M_big = gap + self.t_horizon - self.T_min[q]
+            self.C3[q, p] = self.MILP.addConstr(self.T[q] - self.T[p] + M_big * (1 - B) >= gap,
+                                                name="C3[%d,%d]" % (q, p))
+        self.MILP.update()
+
+    def initialize_objective_function(self, w_1=0.5, w_2=0.5):
+        # J1 over the last member of every platoon, J2 over every vehicle
+        j1 = self.t_slack["slackJ1"] = self.MILP.addVar(lb=0.0, vtype=GRB.CONTINUOUS, name="slack_delta_t_access")
+        j2 = 0
+        for p, members in enumerate(self.platoons):
+            self.MILP.addConstr(j1 >= self.T[p] + self.duration[p], name="cons_t_access[%d]" % p)
+            for r, i in enumerate(members):
+                s = self.t_slack[("slackJ2", i)] = self.MILP.addVar(lb=0.0, vtype=GRB.CONTINUOUS,
+                                                                    name="slack_delta_t_access_abs[%d]" % i)
+                self.MILP.addConstr(s >= self.T[p] + r * self.t_gap1 - self.t0s[i],
+                                    name="cons_t_access_pos_difference[%d]" % i)
+                self.MILP.addConstr(s >= -(self.T[p] + r * self.t_gap1 - self.t0s[i]),
+                                    name="cons_t_access_neg_difference[%d]" % i)
+                j2 += s
+        self.MILP.setObjective(w_1 * j1 + w_2 * j2, GRB.MINIMIZE)
+        self.MILP.update()
+
+    def optimize(self):
+        self.MILP.optimize()
+        if self.MILP.SolCount:
+            for p, members in enumerate(self.platoons):
+                for r, i in enumerate(members):
+                    self.t_access[i] = self.T[p].X + r * self.t_gap1
+        return self.t_access
+
+
+def aggregation_report(vehicles, w_1=0.5, w_2=0.5, t_gap1=1, t_gap2=7.5, v_max=30, max_spacing=30, max_size=None,
+                       time_limit=None, printing=False):
+    # Solve with and without platoons and report the model sizes and the optimality loss of aggregating
+    models = {"vehicles": MILP_Model("vehicles", list(vehicles), t_gap1=t_gap1, t_gap2=t_gap2, v_max=v_max),
+              "platoons": PlatoonModel("platoons", list(vehicles), t_gap1=t_gap1, t_gap2=t_gap2, v_max=v_max,
+                                       max_spacing=max_spacing, max_size=max_size)}
+    report = {}
+    for key, model in models.items():
+        model.initialize_variables()
+        model.initialize_constraints()
+        model.initialize_objective_function(w_1=w_1, w_2=w_2)
+        if time_limit is not None:
+            model.MILP.setParam("TimeLimit", time_limit)
+        model.optimize()
+        report[key] = {"binaries": model.MILP.NumBinVars, "constraints": model.MILP.NumConstrs,
+                       "objective": model.MILP.ObjVal, "runtime": model.MILP.Runtime, "status": model.MILP.Status,
+                       "bound": model.MILP.ObjBound if model.MILP.IsMIP else model.MILP.ObjVal}
+    sizes = [len(members) for members in models["platoons"].platoons]
+    report["platoons"].update(count=len(sizes), mean_size=float(np.mean(sizes)) if sizes else 0,
+                              max_size=max(sizes, default=0))
+    # Against the unaggregated incumbent; only a true optimality loss if that solve reached optimality (status 2)
+    report["loss"] = report["platoons"]["objective"] - report["vehicles"]["objective"]
+    report["relative_loss"] = report["loss"] / report["vehicles"]["objective"] if report["vehicles"]["objective"] else 0
+    if printing:
+        print(*(f"{key}: {value}" for key, value in report.items()), sep="\n")
+    return report
@@ -1,35 +1,47 @@
-import matplotlib.pyplot as plt
-from matplotlib.patches import Rectangle
+import os
+import sys
 import matplotlib
 import numpy as np
-from matplotlib.lines import Line2D
 
-matplotlib.use('TkAgg')
+# TkAgg windows where there is a display, Agg (no windows, figures can still be saved) on headless machines;
+# an explicit MPLBACKEND always wins
+if "MPLBACKEND" not in os.environ:
+    matplotlib.use('TkAgg' if sys.platform in ("win32", "darwin") or os.environ.get("DISPLAY")
+                   or os.environ.get("WAYLAND_DISPLAY") else 'Agg')
+
+import matplotlib.pyplot as plt
+from matplotlib.patches import Rectangle
+from matplotlib.lines import Line2D
 
 def plot_vehicle_position(vehicle_list):
     fig, ax = plt.subplots()
     max_limit = 0
     margin = 10
-    max_limit = max(vehicle.d0 for vehicle in vehicle_list) * 1.05
+    # A VehicleBatch is read through its arrays, without creating a Vehicle per entry
+    if hasattr(vehicle_list, "d0s"):
+        ks, d0s = vehicle_list.ks, vehicle_list.d0s
+    else:
+        ks, d0s = [vehicle.k for vehicle in vehicle_list], [vehicle.d0 for vehicle in vehicle_list]
+    max_limit = max(d0s) * 1.05
     # Plot the vehicle position as rectangles
-    for vehicle in vehicle_list:
+    for k, d0 in zip(ks, d0s):
         x = 0
         y = 0
         width = max_limit/60
         height = max_limit/30
 
         rectangle = None
-        if vehicle.k == "North":
-            y = -vehicle.d0
+        if k == "North":
+            y = -d0
             rectangle = Rectangle((x - width / 2, y - height / 2), width, height, edgecolor='blue', facecolor='blue')
-        elif vehicle.k == "South":
-            y = vehicle.d0
+        elif k == "South":
+            y = d0
             rectangle = Rectangle((x - width / 2, y - height / 2), width, height, edgecolor='blue', facecolor='blue')
-        elif vehicle.k == "East":
-            x = -vehicle.d0
+        elif k == "East":
+            x = -d0
             rectangle = Rectangle((x - height / 2, y - width / 2), height, width, edgecolor='red', facecolor='red')
-        elif vehicle.k == "West":
-            x = vehicle.d0
+        elif k == "West":
+            x = d0
             rectangle = Rectangle((x - height / 2, y - width / 2), height, width, edgecolor='red', facecolor='red')
 
         ax.add_patch(rectangle)
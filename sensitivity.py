@@ -1,12 +1,16 @@
-from matplotlib.ticker import MaxNLocator
-from MILP_OOP import MILP_Model, Vehicle
-import matplotlib.pyplot as plt
+from concurrent.futures import ProcessPoolExecutor
+from MILP_OOP import MILP_Model, Vehicle, seed as scenario_seed, w_overtake
+from backends import MatrixModel
+import multiprocessing
+import os
 import numpy as np
-import matplotlib as mpl
 
+# matplotlib is imported inside the plotting functions, so sweep workers start without it
 
 
-def general_plot(x, y, x_label="x", y_label="y", title="title"):
+def general_plot(x, y, x_label="x", y_label="y", title="title", reference=None):
+    # reference: cost of the default case, drawn as a dashed line
+    import matplotlib.pyplot as plt
     fig, ax = plt.subplots()
     ax.plot(x, y, linewidth=1.0)
     # ax.set(xlim=(0, 1.1*max(x)), xticks=np.arange(0, max(x), 1),
@@ -17,36 +21,302 @@ def general_plot(x, y, x_label="x", y_label="y", title="title"):
     ax.set_xlabel(f'{x_label}')
     ax.set_ylabel(f'{y_label}')
     ax.axhline(y=0, color='k', linewidth=1)
-    plt.axhline(y=42.705, color='r', linestyle='--')
+    if reference is not None:
+        plt.axhline(y=reference, color='r', linestyle='--')
     ax.axvline(x=0, color='k', linewidth=1)
     ax.set_title(f'{title}')
     plt.show()
 
 
-def default_case(vehicles=15, w1=0.5, w2=0.5, tgap1=1, tgap2=7.5, vmax=30, v_init=20, acc=3):
-    list_vehicles = [Vehicle(i, v0=v_init, a_acc=acc) for i in range(vehicles)]
-    example = MILP_Model(f"run", list_vehicles, t_gap1=tgap1, t_gap2=tgap2, v_max=vmax)
+def case_vehicles(vehicles=15, v_init=20, acc=3):
+    return [Vehicle(i, v0=v_init, a_acc=acc) for i in range(vehicles)]
+
+
+def case_key(cache, vehicles=15, w1=0.5, w2=0.5, tgap1=1, tgap2=7.5, vmax=30, v_init=20, acc=3, backend="gurobi"):
+    # The backend is part of the key: the backends record different solver statistics for the same case
+    return cache.key(case_vehicles(vehicles, v_init, acc), seed=scenario_seed,
+                     w1=w1, w2=w2, tgap1=tgap1, tgap2=tgap2, vmax=vmax, backend=backend)
+
+
+def case_result(example):
+    # Objective, solver statistics and access times of a solved case (cached and stored per sweep point)
+    if isinstance(example, MatrixModel):
+        return dict(example.stats, t=[example.t[i] for i in range(example.no_vehicles)])
+    is_mip = example.MILP.IsMIP
+    return {"objective": example.MILP.getObjective().getValue(), "status": example.MILP.Status,
+            "runtime": example.MILP.Runtime, "node_count": example.MILP.NodeCount if is_mip else 0,
+            "mip_gap": example.MILP.MIPGap if is_mip else 0, "t": [example.t[i].X for i in range(example.no_vehicles)]}
+
+
+def build_case(vehicles=15, w1=0.5, w2=0.5, tgap1=1, tgap2=7.5, vmax=30, v_init=20, acc=3, threads=None,
+               backend="gurobi"):
+    # backend: "gurobi" builds a MILP_Model, "highs" the same model as backends.MatrixModel (no license needed)
+    list_vehicles = case_vehicles(vehicles, v_init, acc)
+    if backend == "gurobi":
+        example = MILP_Model(f"run", list_vehicles, t_gap1=tgap1, t_gap2=tgap2, v_max=vmax)
+        if threads is not None:
+            example.MILP.setParam("Threads", threads)
+    else:
+        example = MatrixModel(f"run", list_vehicles, t_gap1=tgap1, t_gap2=tgap2, v_max=vmax)
     example.initialize_variables()
     example.initialize_constraints()
     example.initialize_objective_function(w_1=w1, w_2=w2)
-    example.optimize()
-    cost = example.MILP.getObjective().getValue()
-    return cost
+    return example
+
+
+def solve_case(vehicles=15, w1=0.5, w2=0.5, tgap1=1, tgap2=7.5, vmax=30, v_init=20, acc=3, threads=None,
+               cache=None, backend="gurobi"):
+    # cache: optional cache.ResultCache, a hit skips building and solving the model
+    if cache is not None:
+        key = case_key(cache, vehicles, w1, w2, tgap1, tgap2, vmax, v_init, acc, backend)
+        result = cache.get(key)
+        if result is not None:
+            return result
+    example = build_case(vehicles, w1, w2, tgap1, tgap2, vmax, v_init, acc, threads, backend)
+    if backend == "gurobi":
+        example.optimize()
+    else:
+        example.optimize(backend, threads=threads)
+    result = case_result(example)
+    if cache is not None:
+        cache.put(key, result)
+    return result
+
+
+def default_case(vehicles=15, w1=0.5, w2=0.5, tgap1=1, tgap2=7.5, vmax=30, v_init=20, acc=3, threads=None,
+                 cache=None, backend="gurobi"):
+    return solve_case(vehicles, w1, w2, tgap1, tgap2, vmax, v_init, acc, threads, cache, backend)["objective"]
+
+
+def update_case(example, w1=0.5, w2=0.5, tgap1=1, tgap2=7.5, vmax=30, v_init=20, acc=3):
+    # Move a built case to new parameters in place (objective coefficients, right-hand sides and big-M only)
+    if (w1, w2) != (example.w_1, example.w_2):
+        example.set_weights(w1, w2)
+    if (tgap1, tgap2) != (example.t_gap1, example.t_gap2):
+        example.set_gaps(tgap1, tgap2)
+    if vmax != example.v_max:
+        example.set_v_max(vmax)
+    if any(a != acc for a in example.a_accs):
+        example.set_acceleration(acc)
+    for i, v0 in enumerate(example.v0s):
+        if v0 != v_init:
+            example.update_vehicle_state(i, v0=v_init)
+
+
+def parametric_results(points, threads=None, cache=None):
+    # Like [solve_case(**point) for point in points], but the model is built once and only modified in place
+    # between points, each re-solve starting from the previous solution. A change of vehicle count (structure)
+    # triggers a rebuild.
+    defaults = dict(vehicles=15, w1=0.5, w2=0.5, tgap1=1, tgap2=7.5, vmax=30, v_init=20, acc=3)
+    example, results = None, []
+    for point in points:
+        params = dict(defaults, **point)
+        if cache is not None:
+            key = case_key(cache, **params)
+            result = cache.get(key)
+            if result is not None:
+                results.append(result)
+                continue
+        vehicles = params.pop("vehicles")
+        if example is None or example.no_vehicles != vehicles:
+            example = build_case(vehicles, threads=threads, **params)
+        else:
+            update_case(example, **params)
+        example.optimize()
+        results.append(case_result(example))
+        if cache is not None:
+            cache.put(key, results[-1])
+    return results
+
+
+def parametric_sweep(points, threads=None, cache=None):
+    return [result["objective"] for result in parametric_results(points, threads, cache)]
+
+
+def multi_scenario_results(points, threads=None, cache=None):
+    # Like [solve_case(**point) for point in points], but points that differ only in w1, w2, tgap1 and tgap2 are
+    # solved together as the scenarios of one Gurobi multi-scenario model (MILP_Model.set_scenarios), which
+    # shares presolve and the branch-and-bound tree. The model is built with the largest gaps of its group, so
+    # its big-M and horizon hold for every scenario.
+    defaults = dict(vehicles=15, w1=0.5, w2=0.5, tgap1=1, tgap2=7.5, vmax=30, v_init=20, acc=3)
+    params = [dict(defaults, **point) for point in points]
+    results = [None] * len(points)
+    groups = {}
+    for i, point in enumerate(params):
+        if cache is not None:
+            results[i] = cache.get(case_key(cache, **point))
+        if results[i] is None:
+            groups.setdefault(tuple(point[name] for name in ("vehicles", "vmax", "v_init", "acc")), []).append(i)
+    for (vehicles, vmax, v_init, acc), members in groups.items():
+        example = build_case(vehicles, tgap1=max(params[i]["tgap1"] for i in members),
+                             tgap2=max(params[i]["tgap2"] for i in members), vmax=vmax, v_init=v_init, acc=acc,
+                             threads=threads)
+        example.set_scenarios([dict(w_1=params[i]["w1"], w_2=params[i]["w2"], t_gap1=params[i]["tgap1"],
+                                    t_gap2=params[i]["tgap2"]) for i in members])
+        example.optimize(warm_start=False)
+        for i, scenario in zip(members, example.scenario_results()):
+            results[i] = {"objective": scenario["objective"], "status": scenario["status"],
+                          "runtime": example.MILP.Runtime / len(members), "node_count": example.MILP.NodeCount,
+                          "mip_gap": (abs(scenario["objective"] - scenario["bound"]) / abs(scenario["objective"])
+                                      if scenario["objective"] else 0), "t": scenario["t"]}
+            if cache is not None:
+                cache.put(case_key(cache, **params[i]), results[i])
+    return results
+
+
+def multi_scenario_sweep(points, threads=None, cache=None):
+    return [result["objective"] for result in multi_scenario_results(points, threads, cache)]
+
+
+def _run_point(point):
+    return solve_case(**point)
+
+
+def _run_parametric(args):
+    points, threads, cache = args
+    return parametric_results(points, threads, cache)
+
+
+def sweep_results(points, workers=None, threads_per_worker=1, parametric=False, cache=None, backend="gurobi",
+                  multi_scenario=False):
+    # Yields solve_case results for the points, in order, as they become available.
+    # Points are fanned out to `workers` processes (default: one per core) with `threads_per_worker` Gurobi
+    # threads each so the cores are not oversubscribed. workers=1 runs in this process with the same thread
+    # setting, which gives the same results. With parametric=True every worker takes a contiguous block of
+    # points and re-solves one model in place (parametric_results). cache (cache.ResultCache) skips points that
+    # were solved before. backend selects the solver of solve_case; parametric re-solves need Gurobi.
+    # multi_scenario=True solves the points in this process as Gurobi scenarios (multi_scenario_results), using
+    # workers * threads_per_worker threads.
+    points = list(points)
+    if (parametric or multi_scenario) and backend != "gurobi":
+        raise ValueError("parametric and multi-scenario sweeps modify a Gurobi model, use backend='gurobi'")
+    if not points:
+        return
+    if multi_scenario:
+        yield from multi_scenario_results(points, (workers or os.cpu_count() or 1) * threads_per_worker, cache)
+        return
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = max(1, min(workers, len(points)))
+    if parametric:
+        size = -(-len(points) // workers)
+        tasks = [(points[i:i + size], threads_per_worker, cache) for i in range(0, len(points), size)]
+        if workers == 1:
+            for task in tasks:
+                yield from _run_parametric(task)
+            return
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+            for results in pool.map(_run_parametric, tasks):
+                yield from results
+        return
+
+    points = [dict(point, threads=threads_per_worker, cache=cache, backend=backend) for point in points]
+    if workers == 1:
+        yield from map(_run_point, points)
+        return
+    # Fresh interpreters rather than forks of a process that may already hold a Gurobi environment
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        yield from pool.map(_run_point, points, chunksize=max(1, len(points) // (4 * workers)))
+
+
+def run_sweep(points, workers=None, threads_per_worker=1, parametric=False, cache=None, store=None,
+              backend="gurobi", multi_scenario=False):
+    # Costs of the points in order (see sweep_results). store (sweep_store.SweepStore) checkpoints every point
+    # as it finishes; points already in the store are not solved again, so an interrupted sweep resumes.
+    points = list(points)
+    todo = [i for i, point in enumerate(points) if store is None or point not in store]
+    costs = {}
+    for i, result in zip(todo, sweep_results([points[i] for i in todo], workers, threads_per_worker,
+                                             parametric, cache, backend, multi_scenario)):
+        if store is not None:
+            store.append(points[i], result)
+        costs[i] = result["objective"]
+    return [costs[i] if i in costs else store.lookup(point)["objective"] for i, point in enumerate(points)]
+
+
+def pareto_front(vehicles=15, tgap1=1, tgap2=7.5, vmax=30, v_init=20, acc=3, threads=None, delta=1e-4, tol=1e-6,
+                 mip_gap=0):
+    # Vertices of the (J1, J2) trade-off of the weighted objective w1*J1 + (1-w1)*J2, by weight bisection: the
+    # two extreme vertices come from w1 = 1-delta and w1 = delta; between two known vertices the weight where
+    # both cost the same is solved, and either gives a new vertex (recurse on both sides) or proves the two
+    # adjacent. One model is built and only its objective weights change, so every solve starts warm.
+    # Returns the vertices by increasing J1, each with the w1 interval where it is optimal, and the solve count.
+    example = build_case(vehicles, 1 - delta, delta, tgap1, tgap2, vmax, v_init, acc, threads)
+    solves = []
+
+    def solve(w1):
+        example.set_weights(w1, 1 - w1)
+        example.optimize(mip_gap=mip_gap)
+        result = example.result
+        solves.append(w1)
+        return {"J1": result.J1, "J2": result.J2, "JO": result.JO, "t": result.t.tolist()}
+
+    def weight(a, b):
+        # w1 at which vertices a (lower J1) and b cost the same
+        return (a["J2"] - b["J2"]) / ((a["J2"] - b["J2"]) + (b["J1"] - a["J1"]))
+
+    def between(a, b):
+        if b["J1"] - a["J1"] <= tol * (1 + abs(a["J1"])) or a["J2"] - b["J2"] <= tol * (1 + abs(b["J2"])):
+            return []
+        w1 = weight(a, b)
+        c = solve(w1)
+        cost = w1 * a["J1"] + (1 - w1) * a["J2"]
+        if w1 * c["J1"] + (1 - w1) * c["J2"] >= cost - tol * (1 + abs(cost)):
+            return []
+        return between(a, c) + [c] + between(c, b)
+
+    first, last = solve(1 - delta), solve(delta)
+    vertices = [first] + between(first, last) + ([last] if last["J1"] > first["J1"] + tol * (1 + first["J1"])
+                                                 else [])
+    breakpoints = [weight(a, b) for a, b in zip(vertices, vertices[1:])]
+    for vertex, w1_max, w1_min in zip(vertices, [1.0] + breakpoints, breakpoints + [0.0]):
+        vertex["w1_min"], vertex["w1_max"] = w1_min, w1_max
+    return {"vertices": vertices, "breakpoints": breakpoints, "solves": len(solves)}
+
+
+def front_costs(front, w1_range):
+    # Weighted optimum (objective of default_case with w2 = 1 - w1) along w1_range from the front's vertices
+    w1 = np.asarray(w1_range, dtype=float)[:, None]
+    J1, J2, JO = (np.array([vertex[key] for vertex in front["vertices"]], dtype=float) for key in ("J1", "J2", "JO"))
+    return (w1 * J1 + (1 - w1) * J2 + w_overtake * JO).min(axis=1)
+
+
+def plot_store(store, x, y="objective", x_label=None, y_label="Objective Cost", title=None):
+    # Plot a metric of a checkpointed sweep straight from its store
+    import matplotlib.pyplot as plt
+    xs, ys = store.column(x), store.column(y)
+    order = np.argsort(xs)
+    order = order[~np.isnan(xs[order])]
+    fig, ax = plt.subplots()
+    ax.plot(xs[order], ys[order], linewidth=1.0)
+    ax.set_xlabel(x_label or x)
+    ax.set_ylabel(y_label)
+    ax.set_title(title or f"{y} against {x}")
+    plt.show()
+    return [xs[order], ys[order]]
 
 
-def weight_sensitivity():
+def weight_sensitivity(workers=None, parametric=False, cache=None, store=None, backend="gurobi", pareto=False,
+                       multi_scenario=False):
+    # pareto: the curve from the vertices of pareto_front (a handful of solves) instead of one solve per weight
+    import matplotlib.pyplot as plt
+    from matplotlib.ticker import MaxNLocator
     w1_range = np.arange(0, 1.005, 0.005)
     w2_range = 1 - w1_range
     weightsrange = np.array([w1_range, w2_range]).T
 
-    cost_list = []
-    for j, row in enumerate(weightsrange):
-        print(j, row)
-        cost_list.append(default_case(w1=row[0], w2=row[1]))
+    if pareto:
+        cost_list = front_costs(pareto_front(), w1_range).tolist()
+    else:
+        cost_list = run_sweep([dict(w1=row[0], w2=row[1]) for row in weightsrange], workers,
+                              parametric=parametric, cache=cache, store=store, backend=backend,
+                              multi_scenario=multi_scenario)
 
+    # Reference line at the cost of the default case (seed scenario, all defaults)
+    reference = default_case(cache=cache, backend=backend)
     fig, ax = plt.subplots(layout="constrained")
     ax.plot(w1_range, cost_list, linewidth=1.0)
-    plt.axhline(y=42.705, color='r', linestyle='--')
+    plt.axhline(y=reference, color='r', linestyle='--')
 
     ax.set_xlabel(f'W1 Value')
     ax.set_ylabel(f'Objective Function Cost')
@@ -59,7 +329,7 @@ def weight_sensitivity():
         arrowstyle="->",
         connectionstyle="angle,angleA=0,angleB=90,rad=10")
     ax.annotate(
-        f'Default Cost = 42.705, W1 = 0.5, W2 = 0.5',
+        f'Default Cost = {reference:.3f}, W1 = 0.5, W2 = 0.5',
         (w1_range[100], cost_list[100]),
         xytext=(-2 * offset, offset), textcoords='offset points',
         bbox=bbox, arrowprops=arrowprops)
@@ -77,18 +347,16 @@ def weight_sensitivity():
     return [w1_range, cost_list]
 
 
-def vehicle_sensitivity():
+def vehicle_sensitivity(workers=None, parametric=False, cache=None, store=None, backend="gurobi"):
     vehicle_range = np.arange(2, 24)
-    cost_list = []
-
-    for i in vehicle_range:
-        print(i)
-        cost_list.append(default_case(vehicles=i))
+    cost_list = run_sweep([dict(vehicles=int(i)) for i in vehicle_range], workers,
+                          parametric=parametric, cache=cache, store=store, backend=backend)
 
     general_plot(vehicle_range, cost_list,
                  x_label="Number of Vehicles",
                  y_label="Objective Function Cost",
-                 title="Cost of the Objective Function against the Number of Vehicles")
+                 title="Cost of the Objective Function against the Number of Vehicles",
+                 reference=default_case(cache=cache, backend=backend))
 
     return [vehicle_range, cost_list]
 
@@ -96,25 +364,22 @@ def vehicle_sensitivity():
 # costs = vehicle_sensitivity()
 # print(min(costs[1]), max(costs[1]))
 
-def tgap1_sensitivity():
+def tgap1_sensitivity(workers=None, parametric=False, cache=None, store=None, backend="gurobi",
+                      multi_scenario=False):
+    import matplotlib.pyplot as plt
     tgap1_range = np.arange(0, 6.1, 0.1)
     tgap2_range = np.arange(0, 15.5, 0.5)
-    cost_list1 = []
-    cost_list2 = []
-
-    for x in tgap1_range:
-        print(x)
-        cost_list1.append(default_case(tgap1=x))
-
-    for y in tgap2_range:
-        print(y)
-        cost_list2.append(default_case(tgap2=y))
+    costs = run_sweep([dict(tgap1=x) for x in tgap1_range] + [dict(tgap2=y) for y in tgap2_range], workers,
+                      parametric=parametric, cache=cache, store=store, backend=backend, multi_scenario=multi_scenario)
+    cost_list1 = costs[:len(tgap1_range)]
+    cost_list2 = costs[len(tgap1_range):]
+    reference = default_case(cache=cache, backend=backend)
 
     fig, ax = plt.subplots()
     ax.plot(tgap1_range, cost_list1, linewidth=1.0, label="tgap 1")
     ax.plot(tgap2_range, cost_list2, linewidth=1.0, label="tgap 2")
     plt.legend()
-    plt.axhline(y=42.705, color='r', linestyle='--')
+    plt.axhline(y=reference, color='r', linestyle='--')
 
     ax.set_xlabel("Time Gap (s)")
     ax.set_ylabel("Objective Cost")
@@ -123,22 +388,18 @@ def tgap1_sensitivity():
     return [tgap1_range, cost_list1]
 
 
-tgap1_sensitivity()
-
-
-def tgap2_sensitivity():
+def tgap2_sensitivity(workers=None, parametric=False, cache=None, store=None, backend="gurobi",
+                      multi_scenario=False):
+    import matplotlib.pyplot as plt
+    import matplotlib as mpl
     tgap1_range = np.linspace(0, 5, 10)
     tgap2_range = np.linspace(0, 15.5, 10)
     tgaprange = np.array(([tgap1_range, tgap2_range])).T
-    print('shape', tgaprange.shape)
-    cost_list = np.zeros(tgaprange.shape)
-    print(cost_list.shape)
 
     X, Y = np.meshgrid(tgap1_range, tgap2_range)
-    for i, t1 in enumerate(tgap1_range):
-        for j, t2 in enumerate(tgap2_range):
-            print(i, j)
-            cost_list[i, j] = default_case(tgap1=t1, tgap2=t2)
+    costs = run_sweep([dict(tgap1=t1, tgap2=t2) for t1 in tgap1_range for t2 in tgap2_range], workers,
+                      parametric=parametric, cache=cache, store=store, backend=backend, multi_scenario=multi_scenario)
+    cost_list = np.array(costs).reshape(len(tgap1_range), len(tgap2_range))
 
     plt.style.use('_mpl-gallery')
 
@@ -159,27 +420,26 @@ def tgap2_sensitivity():
     return [tgaprange, cost_list]
 
 
-def v0_and_vmax_sensitivity():
+def v0_and_vmax_sensitivity(workers=None, parametric=False, cache=None, store=None, backend="gurobi"):
+    import matplotlib.pyplot as plt
     vmax_range = np.arange(50, 60.1, 0.1)
     vmax_range = np.arange(10, 70, 0.5)
 
     # v0_range = np.arange(1, 50.05, 0.05)
 
-    cost_list_vmax = []
+    cost_list_vmax = run_sweep([dict(vmax=x) for x in vmax_range], workers, parametric=parametric, cache=cache,
+                               store=store, backend=backend)
     cost_list_v0 = []
 
-    for x in vmax_range:
-        print(x)
-        cost_list_vmax.append(default_case(vmax=x))
-
     # for y in v0_range:
     #     print(y)
     #     cost_list_v0.append(default_case(v_init=y))
+    reference = default_case(cache=cache, backend=backend)
 
     fig, ax = plt.subplots()
     ax.plot(vmax_range, cost_list_vmax, linewidth=1.0)
     # ax.plot(v0_range, cost_list_v0, linewidth=1.0)
-    plt.axhline(y=42.705, color='r', linestyle='--')
+    plt.axhline(y=reference, color='r', linestyle='--')
 
     ax.set_xlabel("Maximum Velocity Vmax [m/s]")
     ax.set_ylabel("Objective Cost")
@@ -191,16 +451,16 @@ def v0_and_vmax_sensitivity():
     return [vmax_range, cost_list_v0]
 
 
-def acc_sensitivity():
+def acc_sensitivity(workers=None, parametric=False, cache=None, store=None, backend="gurobi"):
+    import matplotlib.pyplot as plt
     acc_range = np.arange(0.5, 15.05, 0.05)
-    cost_list = []
-    for x in acc_range:
-        print(x)
-        cost_list.append(default_case(acc=x))
+    cost_list = run_sweep([dict(acc=x) for x in acc_range], workers, parametric=parametric, cache=cache, store=store,
+                          backend=backend)
+    reference = default_case(cache=cache, backend=backend)
 
     fig, ax = plt.subplots()
     ax.plot(acc_range, cost_list, linewidth=1.0)
-    plt.axhline(y=42.705, color='r', linestyle='--')
+    plt.axhline(y=reference, color='r', linestyle='--')
 
     ax.set_xlabel("Vehicle Acceleration[m/s^2]")
     ax.set_ylabel("Objective Cost")
@@ -227,3 +487,7 @@ def acc_sensitivity():
 # vmax, - constant cost
 # v0, - quadratic decrease, quick
 # acc - 1/x looking graph, quick
+
+
+if __name__ == '__main__':
+    tgap1_sensitivity()
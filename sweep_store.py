@@ -0,0 +1,69 @@
+import os
+import numpy as np
+
+################################
+### Checkpointed sweep store ###
+################################
+# Columnar results of a sensitivity sweep in an .npz file: one column per swept parameter and per metric
+# (objective, status, solve time, node count, MIP gap). The file is rewritten atomically after every point,
+# so an interrupted sweep resumes by skipping the points already stored.
+
+metrics = ("objective", "status", "runtime", "node_count", "mip_gap")
+
+
+class SweepStore:
+    def __init__(self, path):
+        self.path = path
+        self.params = []  # Parameter column names, in order of appearance
+        self.columns = {name: [] for name in metrics}
+        self.index = {}  # point key -> row
+        if os.path.exists(path):
+            with np.load(path) as data:
+                self.params = data["__params__"].tolist()
+                for name in list(metrics) + self.params:
+                    self.columns[name] = data[name].tolist()
+            for row in range(len(self)):
+                point = {name: self.columns[name][row] for name in self.params
+                         if not np.isnan(self.columns[name][row])}
+                self.index[self.point_key(point)] = row
+
+    @staticmethod
+    def point_key(point):
+        return tuple(sorted((name, float(value)) for name, value in point.items()))
+
+    def __len__(self):
+        return len(self.columns["objective"])
+
+    def __contains__(self, point):
+        return self.point_key(point) in self.index
+
+    def lookup(self, point):
+        row = self.index[self.point_key(point)]
+        return {name: self.columns[name][row] for name in list(metrics) + self.params}
+
+    def append(self, point, result):
+        for name in point:
+            if name not in self.params:
+                self.params.append(name)
+                self.columns[name] = [np.nan] * len(self)
+        self.index[self.point_key(point)] = len(self)
+        for name in self.params:
+            self.columns[name].append(float(point.get(name, np.nan)))
+        for name in metrics:
+            value = result.get(name)
+            self.columns[name].append(np.nan if value is None else float(value))
+        self.save()
+
+    def save(self):
+        arrays = {name: np.array(values, dtype=float) for name, values in self.columns.items()}
+        tmp = self.path + ".tmp"
+        with open(tmp, "wb") as file:
+            np.savez(file, __params__=np.array(self.params, dtype=str), **arrays)
+        os.replace(tmp, self.path)
+
+    def column(self, name):
+        return np.array(self.columns[name], dtype=float)
+
+    def to_frame(self):
+        import pandas as pd
+        return pd.DataFrame({name: self.column(name) for name in self.params + list(metrics)})
@@ -0,0 +1,47 @@
+import unittest
+import numpy as np
+from MILP_OOP import Vehicle
+from backends import MatrixModel
+from sensitivity import solve_case, run_sweep
+from test_milp_model import build
+
+
+class TestBackends(unittest.TestCase):
+    def build(self, lane_order_fixed=False):
+        vehicles = [Vehicle(i) for i in range(10)]
+        return (build(vehicles, w_1=0.3, w_2=0.7, vectorized=True, lane_order_fixed=lane_order_fixed),
+                build(vehicles, MatrixModel, w_1=0.3, w_2=0.7, lane_order_fixed=lane_order_fixed))
+
+    def test_matrices_match_gurobi_model(self):
+        for lane_order_fixed in (False, True):
+            gurobi, matrix = self.build(lane_order_fixed)
+            c, A, rhs, lb, ub, integrality = matrix.matrices()
+            variables, constraints = gurobi.MILP.getVars(), gurobi.MILP.getConstrs()
+            self.assertEqual(gurobi.MILP.getAttr("VarName", variables), matrix.var_names)
+            self.assertEqual(gurobi.MILP.getAttr("ConstrName", constraints), matrix.constr_names)
+            self.assertEqual((gurobi.MILP.getA() != A).nnz, 0)
+            np.testing.assert_allclose(gurobi.MILP.getAttr("RHS", constraints), rhs)
+            np.testing.assert_allclose(gurobi.MILP.getAttr("Obj", variables), c)
+            np.testing.assert_allclose(gurobi.MILP.getAttr("UB", variables), ub)
+            self.assertEqual([v == "B" for v in gurobi.MILP.getAttr("VType", variables)], list(integrality == 1))
+
+    def test_backends_agree(self):
+        gurobi, matrix = self.build()
+        gurobi.optimize()
+        for backend in ("highs", "gurobi"):
+            stats = matrix.optimize(backend)
+            self.assertEqual(stats["status"], 2)
+            self.assertAlmostEqual(stats["objective"], gurobi.MILP.ObjVal, places=4)
+            self.assertEqual(len(matrix.t), 10)
+
+    def test_sensitivity_backend(self):
+        highs = solve_case(vehicles=8, backend="highs")
+        gurobi = solve_case(vehicles=8)
+        self.assertAlmostEqual(highs["objective"], gurobi["objective"], places=4)
+        self.assertEqual(len(highs["t"]), 8)
+        with self.assertRaises(ValueError):
+            run_sweep([dict(vehicles=8)], workers=1, parametric=True, backend="highs")
+
+
+if __name__ == '__main__':
+    unittest.main()
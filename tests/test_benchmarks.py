@@ -0,0 +1,46 @@
+import unittest
+import json
+import os
+import tempfile
+from benchmarks import arrival_stream, find_regressions, run_engine, scaling_benchmark
+
+
+class TestBenchmarks(unittest.TestCase):
+    def test_direction_mix(self):
+        vehicles = arrival_stream(50, mix=(1, 0, 1, 0))
+        self.assertEqual({vehicle.k for vehicle in vehicles}, {'North', 'East'})
+
+    def test_scaling_benchmark(self):
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, "baseline.json")
+            results = scaling_benchmark(sizes=(5,), mixes=("uniform",), t_gap2s=(7.5,),
+                                        engine_names=("loop", "lane_order_fixed", "dp_heuristic_shift3"),
+                                        output=output, printing=False)
+            with open(output) as file:
+                self.assertEqual(json.load(file), results)
+        self.assertEqual(len(results), 3)
+        self.assertTrue(all(record["solved"] for record in results))
+        # The windowed DP is a heuristic, reported as SUBOPTIMAL
+        self.assertEqual([record["status"] for record in results], [2, 2, 13])
+        self.assertAlmostEqual(results[0]["objective"], results[1]["objective"], places=4)
+
+        # Against itself nothing regresses; against a baseline 100x faster every engine does
+        self.assertEqual(find_regressions(results, results), [])
+        fast = [dict(record, solve_time=record["solve_time"] / 100) for record in results]
+        regressions = find_regressions(results, fast, min_time=0)
+        self.assertEqual([record["engine"] for record in regressions],
+                         ["loop", "lane_order_fixed", "dp_heuristic_shift3"])
+        self.assertTrue(all(record["metric"] == "solve_time" for record in regressions))
+
+        # Memory is measured per run, and regresses like the times
+        self.assertTrue(all(record["peak_memory"] > 0 for record in results))
+        small = [dict(record, peak_memory=record["peak_memory"] / 100) for record in results]
+        regressions = find_regressions(results, small, min_memory=0)
+        self.assertEqual({record["metric"] for record in regressions}, {"peak_memory"})
+        self.assertEqual(len(regressions), len(results))
+        self.assertEqual(find_regressions(results, [dict(record, peak_memory=None) for record in small]), [])
+        self.assertNotIn("peak_memory", run_engine("loop", arrival_stream(5), memory=False))
+
+
+if __name__ == '__main__':
+    unittest.main()
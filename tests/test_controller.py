@@ -0,0 +1,47 @@
+import unittest
+import random
+from MILP_OOP import Vehicle
+from controller import IntersectionController, check_schedule
+
+
+class TestController(unittest.TestCase):
+    def setUp(self):
+        rng = random.Random(1)
+        self.arrivals = [(2.5 * i + rng.random(), Vehicle(i, k=rng.choice(['North', 'South', 'East', 'West']),
+                                                          d0=200, v0=15)) for i in range(30)]
+
+    def test_rolling_horizon(self):
+        controller = IntersectionController()
+        summary = controller.run(self.arrivals, duration=150)
+
+        self.assertEqual(summary["served"], 30)
+        self.assertEqual(summary["in_model"], 0)
+        self.assertGreater(summary["solves"], 0)
+        # Bounded model size even though the stream is longer
+        self.assertLess(summary["max_vehicles"], 30)
+        self.assertTrue(check_schedule(controller.served, t_gap1=1, t_gap2=7.5))
+        self.assertTrue(check_schedule(controller.served, t_gap1=1, t_gap2=7.5, v_max=controller.model.v_max,
+                                       t_sim=controller.served_arrivals))
+
+        # The arrivals are left unchanged, so a second controller gives the same run
+        self.assertEqual([vehicle.t0 for _, vehicle in self.arrivals], [200 / 15] * 30)
+        again = IntersectionController().run(self.arrivals, duration=150)
+        for name in ("served", "solves", "max_vehicles", "cumulative_delay"):
+            self.assertEqual(again[name], summary[name])
+
+    def test_frozen_vehicles_keep_access_time(self):
+        controller = IntersectionController(commit_distance=150)
+        committed = {}
+        for t_arrival, vehicle in self.arrivals[:10]:
+            while controller.t_sim < t_arrival:
+                controller.step()
+            controller.step([vehicle])
+            for i, t in controller.model.t_fixed.items():
+                key = id(controller.model.vehicles[i])
+                committed.setdefault(key, t)
+                self.assertAlmostEqual(committed[key], t)
+            self.assertEqual(len(controller.t_access), controller.model.no_vehicles)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,57 @@
+import unittest
+import random
+from MILP_OOP import MILP_Model, Vehicle
+from dp_scheduler import OPTIMAL, SUBOPTIMAL, DPScheduler
+from controller import check_schedule
+from test_milp_model import build
+
+
+def random_vehicles(n, seed):
+    rng = random.Random(seed)
+    return [Vehicle(i, k=rng.choice(['North', 'South', 'East', 'West']), d0=rng.uniform(20, 400),
+                    v0=rng.uniform(10, 25)) for i in range(n)]
+
+
+def solve(vehicles, w_1, w_2, model=MILP_Model, **kwargs):
+    example = build(vehicles, model, w_1=w_1, w_2=w_2, **kwargs)
+    example.optimize()
+    return example
+
+
+class TestDPScheduler(unittest.TestCase):
+    def test_matches_gurobi(self):
+        # Exact for w_2 = 0; for w_2 > 0 an upper bound (seeds 5 and 9 miss the optimum)
+        for seed in range(10):
+            for w_1, w_2 in ((1, 0), (0.5, 0.5), (0.2, 0.8)):
+                milp = solve(random_vehicles(10, seed), w_1, w_2)
+                dp = solve(random_vehicles(10, seed), w_1, w_2, DPScheduler)
+                if w_2 == 0:
+                    self.assertAlmostEqual(dp.objective, milp.MILP.ObjVal, places=3)
+                    self.assertEqual(dp.status, OPTIMAL)
+                else:
+                    self.assertGreaterEqual(dp.objective, milp.MILP.ObjVal - 1e-6)
+                    self.assertEqual(dp.status, SUBOPTIMAL)
+                served = [(vehicle, dp.t[i]) for i, vehicle in enumerate(dp.vehicles)]
+                self.assertTrue(check_schedule(served, dp.t_gap1, dp.t_gap2))
+                self.assertTrue(all(dp.t[i] >= dp.t_min[i] - 1e-6 for i in range(10)))
+
+    def test_max_shift(self):
+        full = solve(random_vehicles(16, 1), 0.5, 0.5, DPScheduler)
+        window = solve(random_vehicles(16, 1), 0.5, 0.5, DPScheduler, max_shift=3)
+        self.assertGreaterEqual(window.objective, full.objective - 1e-6)
+        self.assertLess(window.labels, full.labels)
+        served = [(vehicle, window.t[i]) for i, vehicle in enumerate(window.vehicles)]
+        self.assertTrue(check_schedule(served, window.t_gap1, window.t_gap2))
+
+    def test_getvariables(self):
+        dp = solve([Vehicle(0, k='North'), Vehicle(1, k='East')], 0.5, 0.5, DPScheduler)
+        self.assertEqual(list(dp.getvariables()), ["t[0]", "t[1]"])
+        self.assertEqual(len(dp.order), 2)
+
+    def test_small_t_gap2(self):
+        with self.assertRaises(ValueError):
+            DPScheduler("dp", [], t_gap1=2, t_gap2=0.5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,42 @@
+import unittest
+import numpy as np
+from MILP_OOP import MILP_Model, Vehicle
+from controller import check_schedule
+from kinematics import (desired_access_times, earliest_access_times, latest_access_times, reachable_speeds,
+                        stopping_distances)
+
+
+class TestKinematics(unittest.TestCase):
+    def test_earliest_access_times(self):
+        vehicles = [Vehicle(i, k='North', d0=d0, v0=v0) for i, (d0, v0) in
+                    enumerate([(5, 20), (50, 10), (100, 29), (400, 15), (1000, 30)])]
+        model = MILP_Model("kinematics", vehicles, t_sim=2, v_max=30)
+        t_min = earliest_access_times(model.v0s, model.d0s, model.a_accs, 30, t_sim=2)
+        for i in range(len(vehicles)):
+            v = np.sqrt(model.v0s[i] ** 2 + 2 * model.a_accs[i] * model.d0s[i])
+            dt1 = (min(30, v) - model.v0s[i]) / model.a_accs[i]
+            dt2 = max(model.d0s[i] - (30 ** 2 - model.v0s[i] ** 2) / (2 * model.a_accs[i]), 0) / 30
+            self.assertAlmostEqual(t_min[i], 2 + dt1 + dt2)
+        self.assertEqual(model.compute_t_mins(), {i: model.compute_t_min(i) for i in range(len(vehicles))})
+        self.assertTrue(np.all(reachable_speeds(model.v0s, model.d0s, model.a_accs, 30) <= 30))
+        self.assertTrue(np.allclose(desired_access_times([100, 300], 20), [5, 15]))
+
+    def test_latest_access_times(self):
+        # 20 m/s braking at 4 m/s^2 stops after 50 m
+        self.assertAlmostEqual(float(stopping_distances(20, -4)), 50)
+        t_max = latest_access_times(20, [30, 50, 100], -4, t_sim=1)
+        self.assertAlmostEqual(t_max[0], 1 + (20 - np.sqrt(400 - 240)) / 4)
+        self.assertTrue(np.isinf(t_max[1]) and np.isinf(t_max[2]))
+
+    def test_check_schedule_kinematics(self):
+        vehicle = Vehicle(0, k='North', d0=30, v0=20)
+        t_min = float(earliest_access_times(20, 30, 3, 30))
+        t_max = float(latest_access_times(20, 30, -4))
+        self.assertTrue(check_schedule([(vehicle, t_min)], 1, 7.5, v_max=30))
+        self.assertFalse(check_schedule([(vehicle, t_min - 0.1)], 1, 7.5, v_max=30))
+        self.assertFalse(check_schedule([(vehicle, t_max + 0.1)], 1, 7.5, v_max=30))
+        self.assertTrue(check_schedule([(vehicle, t_max + 0.1)], 1, 7.5))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,6 +1,19 @@
+import json
+import os
+import tempfile
 import unittest
 from gurobipy import Model, GRB, LinExpr, quicksum
-from MILP_OOP import MILP_Model, Vehicle
+from MILP_OOP import MILP_Model, Vehicle, arrival_stream, fcfs_schedule, w_overtake
+
+
+def build(vehicles, model=MILP_Model, w_1=0.5, w_2=0.5, **kwargs):
+    # Model with variables, constraints and objective, ready to optimize
+    example = model("test_model", vehicles, **kwargs)
+    example.initialize_variables()
+    example.initialize_constraints()
+    example.initialize_objective_function(w_1=w_1, w_2=w_2)
+    return example
+
 
 class TestMILPModel(unittest.TestCase):
     def setUp(self):
@@ -22,14 +35,26 @@ class TestMILPModel(unittest.TestCase):
         milp_model = MILP_Model("test_model", list_vehicles)
         milp_model.initialize_variables()
 
+        # One binary per conflicting pair (same lane or crossing axes)
+        no_pairs = len(milp_model.pair_index()[0])
         all_vars = milp_model.MILP.getVars()
-        self.assertEqual(len(all_vars), no_vehicles+no_vehicles*(no_vehicles-1))
+        self.assertEqual(len(all_vars), no_vehicles+no_pairs)
 
         names = milp_model.MILP.getAttr("VarName", all_vars)
         t_vars = [x for x in names if x.startswith('t')]
         B_vars = [x for x in names if x.startswith('B')]
         self.assertEqual(len(t_vars), no_vehicles)
-        self.assertEqual(len(B_vars), no_vehicles*(no_vehicles-1))
+        self.assertEqual(len(B_vars), no_pairs)
+
+    def test_pair_index(self):
+        list_vehicles = [Vehicle(0, k='North'), Vehicle(1, k='South'), Vehicle(2, k='North'), Vehicle(3, k='East')]
+        milp_model = MILP_Model("test_model", list_vehicles)
+        j, k, same = milp_model.pair_index()
+        self.assertEqual(list(zip(j.tolist(), k.tolist(), same.tolist())),
+                         [(0, 2, True), (0, 3, False), (1, 3, False), (2, 3, False)])
+        milp_model.initialize_variables()
+        self.assertEqual(list(milp_model.B2), [(0, 2)])
+        self.assertEqual(list(milp_model.B3), [(0, 3), (1, 3), (2, 3)])
 
     def test_initialize_constraints(self):
         list_vehicles = [Vehicle(1, k='North'), Vehicle(2, k='North'), Vehicle(3, k='West'), Vehicle(4, k='East')]
@@ -94,15 +119,206 @@ class TestMILPModel(unittest.TestCase):
         milp_model.optimize()
         solution = milp_model.getvariables()
 
+        # B2/B3 per conflicting pair plus one overtake binary BO per same-lane pair
+        j, k, same = milp_model.pair_index()
         t_var = [name for name in solution if name.startswith('t')]
         B_var = [name for name in solution if name.startswith('B')]
         J1_var = [name for name in solution if name == 'slack_delta_t_access']
         self.assertEqual(len(t_var), no_vehicles)
-        self.assertEqual(len(B_var), no_vehicles*(no_vehicles-1))
+        self.assertEqual(len(B_var), len(j) + same.sum())
         self.assertEqual(len(J1_var), 1)
 
+    def test_solution(self):
+        for lane_order_fixed in (False, True):
+            milp_model = build([Vehicle(i) for i in range(8)], w_1=0.3, w_2=0.7, lane_order_fixed=lane_order_fixed)
+            milp_model.optimize()
+            result = milp_model.result
+            solution = milp_model.getvariables(only_t=True)
+            self.assertEqual(result.t.tolist(), [solution["t[%d]" % i] for i in range(8)])
+            self.assertEqual(set(result.B3), set(milp_model.B3))
+            self.assertEqual(len(result.BO), 0 if lane_order_fixed else len(milp_model.BO))
+            self.assertAlmostEqual(result.J1, result.t.max(), places=6)
+            self.assertAlmostEqual(0.3 * result.J1 + 0.7 * result.J2 + w_overtake * result.JO, result.objective,
+                                   places=4)
+            self.assertEqual(result.status, GRB.OPTIMAL)
+
+        # No incumbent: no values
+        milp_model = build(arrival_stream(40, headway=3))
+        milp_model.optimize(warm_start=False, time_budget=0)
+        self.assertIsNone(milp_model.result.t)
+        self.assertEqual(milp_model.getvariables(), {})
+
+    def test_profile(self):
+        with tempfile.TemporaryDirectory() as directory:
+            log = os.path.join(directory, "profile.jsonl")
+            milp_model = build([Vehicle(i) for i in range(6)], profile_log=log)
+            milp_model.optimize()
+            with open(log) as file:
+                records = [json.loads(line) for line in file]
+        self.assertEqual(records, milp_model.profile)
+        self.assertEqual([record["phase"] for record in records], ["variables", "constraints", "objective",
+                                                                  "optimize"])
+        self.assertTrue(all(record["wall"] >= 0 and record["cpu"] >= 0 for record in records))
+        self.assertEqual(records[0]["constraints"], 0)
+        self.assertEqual(records[-1]["constraints"], milp_model.MILP.NumConstrs)
+        self.assertEqual(records[-1]["binaries"], milp_model.MILP.NumBinVars)
+        self.assertEqual(records[-1]["status"], GRB.OPTIMAL)
+        self.assertAlmostEqual(records[-1]["objective"], milp_model.MILP.ObjVal)
+
+    def test_time_budget(self):
+        milp_model = build(arrival_stream(40, headway=3))
+        incumbents = []
+        # Stopped by the budget (its wall-clock time is measured by benchmarks.overhead_benchmark)
+        milp_model.optimize(time_budget=0.3, on_incumbent=lambda t, objective, runtime: incumbents.append(objective))
+        result = milp_model.result
+        self.assertIn(result.status, (GRB.TIME_LIMIT, GRB.INTERRUPTED))
+        self.assertFalse(result.optimal)
+        self.assertEqual(len(result.t), 40)
+        self.assertTrue(all(a > b for a, b in zip(incumbents, incumbents[1:])))
+        self.assertAlmostEqual(incumbents[-1], result.objective)
+        self.assertEqual(milp_model.MILP.Params.TimeLimit, float("inf"))
+
+        small = build([Vehicle(i) for i in range(5)])
+        small.optimize(time_budget=30, mip_gap=0)
+        self.assertTrue(small.result.optimal)
+
+    def test_tight_big_m(self):
+        costs = []
+        for tight_big_m in (False, True):
+            milp_model = build([Vehicle(i) for i in range(8)], tight_big_m=tight_big_m)
+            milp_model.optimize()
+            costs.append(milp_model.MILP.ObjVal)
+        self.assertAlmostEqual(costs[0], costs[1], places=4)
+
+        report = milp_model.big_m_report()
+        self.assertTrue(report["tight"])
+        cons_names = milp_model.MILP.getAttr("ConstrName", milp_model.MILP.getConstrs())
+        self.assertEqual(set(report["M"]), {x for x in cons_names if x.startswith(("C2", "C3", "cons_over"))})
+        for name, M in report["M"].items():
+            self.assertLess(M, 1000)
+        for t in milp_model.getvariables(only_t=True).values():
+            self.assertLessEqual(t, report["horizon"] + 1e-6)
+
+    def test_fcfs_schedule(self):
+        ks = ['North', 'North', 'East', 'South', 'West']
+        t = fcfs_schedule(ks, [1, 1.5, 2, 2, 3], [4, 4, 5, 6, 3], t_gap1=1, t_gap2=7.5)
+        self.assertEqual(t.tolist(), [10.5, 11.5, 19, 26.5, 3])
+        for j in range(len(ks)):
+            for k in range(j + 1, len(ks)):
+                if ks[j] == ks[k]:
+                    self.assertGreaterEqual(abs(t[j] - t[k]), 1)
+                elif (ks[j] in ['North', 'South']) != (ks[k] in ['North', 'South']):
+                    self.assertGreaterEqual(abs(t[j] - t[k]), 7.5)
+
+    def test_warm_start(self):
+        milp_model = build([Vehicle(i) for i in range(12)])
+        # Without branching or heuristics the only incumbent is the warm start
+        milp_model.MILP.setParam("NodeLimit", 0)
+        milp_model.MILP.setParam("Heuristics", 0)
+        milp_model.optimize()
+        self.assertGreaterEqual(milp_model.MILP.SolCount, 1)
+        self.assertLessEqual(milp_model.MILP.ObjVal, milp_model.upper_bound + 1e-6)
+
+    def test_incremental_updates(self):
+        list_vehicles = [Vehicle(i) for i in range(8)]
+        given = list_vehicles[:5]
+        milp_model = build(given)
+        for vehicle in list_vehicles[5:]:
+            milp_model.add_vehicle(vehicle)
+        milp_model.remove_vehicle(2)
+        milp_model.update_vehicle_state(0, d0=250, v0=15)
+        # The caller's list and vehicles are left alone
+        self.assertEqual(given, list_vehicles[:5])
+        self.assertEqual((list_vehicles[0].d0, list_vehicles[0].v0), (Vehicle(0).d0, 20))
+        moved = Vehicle(0, k=list_vehicles[0].k, d0=250, v0=15)
+        expected = build([moved, list_vehicles[1]] + list_vehicles[3:])
+
+        self.assertEqual(milp_model.no_vehicles, 7)
+        self.assertEqual(sorted(milp_model.MILP.getAttr("VarName", milp_model.MILP.getVars())),
+                         sorted(expected.MILP.getAttr("VarName", expected.MILP.getVars())))
+        self.assertEqual(sorted(milp_model.MILP.getAttr("ConstrName", milp_model.MILP.getConstrs())),
+                         sorted(expected.MILP.getAttr("ConstrName", expected.MILP.getConstrs())))
+        self.assertAlmostEqual(milp_model.MILP.getConstrByName("C1[0]").RHS, expected.t_min[0])
+        milp_model.optimize()
+        expected.optimize()
+        self.assertAlmostEqual(milp_model.MILP.ObjVal, expected.MILP.ObjVal, places=4)
+
+    def test_vectorized_builder_matches_legacy(self):
+        models = []
+        for vectorized in (False, True):
+            models.append(build([Vehicle(i) for i in range(12)], w_1=0.3, w_2=0.7, vectorized=vectorized).MILP)
+        legacy, vectorized = models
+
+        for attr in ["VarName", "LB", "UB", "Obj", "VType"]:
+            self.assertEqual(legacy.getAttr(attr, legacy.getVars()), vectorized.getAttr(attr, vectorized.getVars()))
+        for attr in ["ConstrName", "Sense"]:
+            self.assertEqual(legacy.getAttr(attr, legacy.getConstrs()),
+                             vectorized.getAttr(attr, vectorized.getConstrs()))
+        for a, b in zip(legacy.getAttr("RHS", legacy.getConstrs()), vectorized.getAttr("RHS", vectorized.getConstrs())):
+            self.assertAlmostEqual(a, b)
+        self.assertEqual((legacy.getA() != vectorized.getA()).nnz, 0)
+
+    def test_lane_order_fixed(self):
+        list_vehicles = [Vehicle(i) for i in range(10)]
+        fixed = build(list_vehicles, lane_order_fixed=True)
+        self.assertEqual(fixed.B2, {})
+        self.assertEqual(fixed.BO, {})
+        lanes = fixed.lane_order()
+        self.assertEqual(len(fixed.C2), sum(len(order) - 1 for order in lanes.values()))
+        for order in lanes.values():
+            for j, k in zip(order, order[1:]):
+                self.assertEqual(fixed.MILP.getRow(fixed.C2[k, j]).size(), 2)
+                self.assertEqual(fixed.C2[k, j].RHS, fixed.t_gap1)
+
+        # Same speeds: serving each lane by distance loses nothing against free ordering (up to the overtake term)
+        fixed.optimize()
+        free = build(list_vehicles)
+        free.optimize()
+        self.assertAlmostEqual(fixed.MILP.ObjVal, free.MILP.ObjVal, places=3)
+        for order in lanes.values():
+            self.assertEqual(sorted(order, key=lambda i: fixed.t[i].X), order)
+
+        vectorized = build(list_vehicles, vectorized=True, lane_order_fixed=True).MILP
+        for attr in ["VarName", "Obj", "VType"]:
+            self.assertEqual(fixed.MILP.getAttr(attr, fixed.MILP.getVars()),
+                             vectorized.getAttr(attr, vectorized.getVars()))
+        self.assertEqual(fixed.MILP.getAttr("ConstrName", fixed.MILP.getConstrs()),
+                         vectorized.getAttr("ConstrName", vectorized.getConstrs()))
+        self.assertEqual((fixed.MILP.getA() != vectorized.getA()).nnz, 0)
+
+        # In-place changes rebuild the precedence rows from the new lane order
+        incremental = build(list_vehicles[:6], lane_order_fixed=True)
+        for vehicle in list_vehicles[6:]:
+            incremental.add_vehicle(vehicle)
+        incremental.remove_vehicle(2)
+        expected = build(list_vehicles[:2] + list_vehicles[3:], lane_order_fixed=True)
+        self.assertEqual(sorted(incremental.C2), sorted(expected.C2))
+        incremental.optimize()
+        expected.optimize()
+        self.assertAlmostEqual(incremental.MILP.ObjVal, expected.MILP.ObjVal, places=4)
+
+    def test_lazy_constraints(self):
+        def solve(vehicles, **kwargs):
+            milp_model = build(vehicles, **kwargs)
+            milp_model.optimize()
+            return milp_model
 
+        eager = solve(arrival_stream(20))
+        for vectorized in (False, True):
+            lazy = solve(arrival_stream(20), lazy=True, vectorized=vectorized)
+            self.assertGreater(len(lazy.lazy_pairs), 0)
+            self.assertEqual(lazy.MILP.NumConstrs, eager.MILP.NumConstrs - 2 * len(lazy.lazy_pairs))
+            self.assertAlmostEqual(lazy.MILP.ObjVal, eager.MILP.ObjVal, places=4)
 
+        # Windows far too narrow: the callback has to add rows, the result is still the eager optimum
+        eager = solve(arrival_stream(16, headway=1))
+        lazy = solve(arrival_stream(16, headway=1), lazy=True, window_slack=0)
+        self.assertGreater(len(lazy.lazy_pending), 0)
+        self.assertAlmostEqual(lazy.MILP.ObjVal, eager.MILP.ObjVal, places=4)
+        pending = lazy.lazy_pending
+        lazy.optimize()
+        self.assertTrue(all(pair in lazy.C2 or pair in lazy.C3 for pair in pending))
+        self.assertAlmostEqual(lazy.MILP.ObjVal, eager.MILP.ObjVal, places=4)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,51 @@
+import unittest
+from MILP_OOP import MILP_Model, Vehicle
+from platoon import PlatoonModel, form_platoons, aggregation_report
+from controller import check_schedule
+
+
+class TestPlatoon(unittest.TestCase):
+    def test_form_platoons(self):
+        ks = ['North', 'North', 'North', 'East', 'North']
+        d0s = [100, 120, 200, 50, 90]
+        self.assertEqual(form_platoons(ks, d0s, max_spacing=30), [[3], [4, 0, 1], [2]])
+        self.assertEqual(form_platoons(ks, d0s, max_spacing=30, max_size=2), [[3], [4, 0], [1], [2]])
+        self.assertEqual(form_platoons(ks, d0s, max_spacing=0), [[3], [4], [0], [1], [2]])
+
+    def test_platoon_model(self):
+        list_vehicles = [Vehicle(i) for i in range(15)]
+        model = PlatoonModel("platoons", list_vehicles, max_spacing=60)
+        model.initialize_variables()
+        model.initialize_constraints()
+        model.initialize_objective_function()
+        model.optimize()
+
+        self.assertLess(len(model.platoons), 15)
+        self.assertEqual(sorted(model.t_access), list(range(15)))
+        served = [(vehicle, model.t_access[i]) for i, vehicle in enumerate(list_vehicles)]
+        self.assertTrue(check_schedule(served, model.t_gap1, model.t_gap2))
+        self.assertTrue(all(model.t_access[i] >= model.t_min[i] - 1e-6 for i in range(15)))
+        for members in model.platoons:
+            for a, b in zip(members, members[1:]):
+                self.assertAlmostEqual(model.t_access[b] - model.t_access[a], model.t_gap1)
+
+    def test_singletons_match_lane_order_fixed(self):
+        list_vehicles = [Vehicle(i) for i in range(10)]
+        model = PlatoonModel("platoons", list_vehicles, max_spacing=0)
+        reference = MILP_Model("vehicles", list_vehicles, lane_order_fixed=True)
+        for m in (model, reference):
+            m.initialize_variables()
+            m.initialize_constraints()
+            m.initialize_objective_function()
+            m.optimize()
+        self.assertAlmostEqual(model.MILP.ObjVal, reference.MILP.ObjVal, places=4)
+
+    def test_aggregation_report(self):
+        report = aggregation_report([Vehicle(i) for i in range(12)], max_spacing=60)
+        self.assertLess(report["platoons"]["binaries"], report["vehicles"]["binaries"])
+        self.assertGreaterEqual(report["loss"], -1e-4)
+        self.assertAlmostEqual(report["relative_loss"], report["loss"] / report["vehicles"]["objective"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,110 @@
+import os
+import tempfile
+import unittest
+from cache import ResultCache
+import numpy as np
+from MILP_OOP import MILP_Model, Vehicle
+from sensitivity import (build_case, case_key, default_case, front_costs, multi_scenario_sweep, parametric_sweep,
+                         pareto_front, run_sweep, solve_case)
+from sweep_store import SweepStore
+
+
+class TestSensitivity(unittest.TestCase):
+    def setUp(self):
+        self.points = [dict(vehicles=6, tgap2=tgap2) for tgap2 in (5, 7.5, 10)] + [dict(vehicles=6, w1=0.2, w2=0.8)]
+
+    def test_run_sweep_sequential(self):
+        costs = run_sweep(self.points, workers=1)
+        self.assertEqual(len(costs), len(self.points))
+        self.assertAlmostEqual(costs[1], default_case(vehicles=6), places=4)
+
+    def test_run_sweep_parallel_matches_sequential(self):
+        self.assertEqual(run_sweep(self.points, workers=2), run_sweep(self.points, workers=1))
+
+    def test_parametric_sweep_matches_default_case(self):
+        points = self.points + [dict(vehicles=6, vmax=20), dict(vehicles=6, acc=2), dict(vehicles=6, v_init=15),
+                                dict(vehicles=7)]
+        costs = parametric_sweep(points, threads=1)
+        for point, cost in zip(points, costs):
+            self.assertAlmostEqual(cost, default_case(threads=1, **point), places=3)
+
+    def test_pareto_front(self):
+        front = pareto_front(vehicles=6, threads=1)
+        vertices = front["vertices"]
+        self.assertGreater(len(vertices), 1)
+        # One solve per vertex plus one per edge proving two vertices adjacent
+        self.assertEqual(front["solves"], 2 * len(vertices) - 1)
+        self.assertTrue(all(a["J1"] < b["J1"] and a["J2"] > b["J2"] for a, b in zip(vertices, vertices[1:])))
+        w1_range = np.linspace(0, 1, 11)
+        costs = parametric_sweep([dict(vehicles=6, w1=w1, w2=1 - w1) for w1 in w1_range], threads=1)
+        self.assertTrue(np.allclose(front_costs(front, w1_range), costs, atol=1e-3))
+
+    def test_multi_scenario_sweep(self):
+        points = self.points + [dict(vehicles=6, tgap1=2, tgap2=5), dict(vehicles=7, tgap2=5)]
+        costs = multi_scenario_sweep(points, threads=1)
+        for point, cost in zip(points, costs):
+            self.assertAlmostEqual(cost, default_case(threads=1, **point), places=3)
+        self.assertEqual(run_sweep(points, multi_scenario=True), costs)
+        example = build_case(vehicles=6, tgap2=5)
+        with self.assertRaises(ValueError):
+            example.set_scenarios([dict(t_gap2=7.5)])
+
+        # With lane_order_fixed the C2 rows have no big-M, the C3 rows still do
+        costs = []
+        for t_gap2 in (5, 7.5):
+            example = MILP_Model("fixed", [Vehicle(i) for i in range(8)], t_gap2=t_gap2, lane_order_fixed=True)
+            example.initialize_variables()
+            example.initialize_constraints()
+            example.initialize_objective_function()
+            example.optimize()
+            costs.append(example.MILP.ObjVal)
+        example.set_scenarios([dict(t_gap2=5), dict(t_gap2=7.5)])
+        example.optimize(warm_start=False)
+        for scenario, cost in zip(example.scenario_results(), costs):
+            self.assertAlmostEqual(scenario["objective"], cost, places=3)
+
+    def test_run_sweep_parametric(self):
+        self.assertEqual(len(run_sweep(self.points, workers=2, parametric=True)), len(self.points))
+
+    def test_result_cache(self):
+        with tempfile.TemporaryDirectory() as directory:
+            cache = ResultCache(os.path.join(directory, "cache.sqlite"), max_entries=3)
+            costs = run_sweep(self.points, workers=1, cache=cache)
+            self.assertEqual(len(cache), 3)  # Oldest entry evicted
+
+            cached = run_sweep(self.points[1:], workers=1, cache=cache)
+            self.assertEqual(cached, costs[1:])
+            # A hit is returned as stored, without solving
+            cache.put(case_key(cache, **self.points[1]), {"objective": -1.0})
+            self.assertEqual(run_sweep(self.points[1:2], workers=1, cache=cache), [-1.0])
+            key = ResultCache.key([], seed=1, w1=0.5)
+            self.assertIsNone(cache.get(key))
+            cache.put(key, {"objective": 1.0})
+            self.assertEqual(cache.get(key), {"objective": 1.0})
+
+            # Each backend has its own entries
+            gurobi = solve_case(vehicles=6, cache=cache)
+            highs = solve_case(vehicles=6, cache=cache, backend="highs")
+            self.assertEqual(solve_case(vehicles=6, cache=cache), gurobi)
+            self.assertEqual(solve_case(vehicles=6, cache=cache, backend="highs"), highs)
+            self.assertNotEqual(case_key(cache, vehicles=6), case_key(cache, vehicles=6, backend="highs"))
+            cache.close()
+
+    def test_sweep_store_resume(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "sweep.npz")
+            costs = run_sweep(self.points[:2], workers=1, store=SweepStore(path))
+
+            store = SweepStore(path)  # As after a restart
+            self.assertEqual(len(store), 2)
+            self.assertIn(self.points[0], store)
+            resumed = run_sweep(self.points, workers=1, store=store)
+            self.assertEqual(resumed[:2], costs)
+            self.assertEqual(len(SweepStore(path)), len(self.points))
+            for name in ("objective", "status", "runtime", "node_count", "mip_gap", "tgap2", "w1"):
+                self.assertEqual(len(store.column(name)), len(self.points))
+            self.assertTrue(all(store.column("status") == 2))
+
+
+if __name__ == '__main__':
+    unittest.main()
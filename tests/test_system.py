@@ -1,3 +1,6 @@
+import os
+import subprocess
+import sys
 import unittest
 from MILP_OOP import Vehicle, MILP_Model
 import plotting
@@ -73,6 +76,16 @@ class TestSystem(unittest.TestCase):
         test.plot_access_times()
         self.assertAlmostEqual(solution['t[1]'] - solution['t[0]'], test.t_gap2)
 
+    def test_headless_import(self):
+        # Fresh interpreter without a display: the solver core must not load the plotting stack or scipy (only the
+        # vectorized builder needs it; the import time is measured by benchmarks.overhead_benchmark)
+        script = ("import sys; import MILP_OOP; "
+                  "print(*[m for m in ('matplotlib.pyplot', 'pandas', 'plotting', 'scipy') if m in sys.modules])")
+        env = {name: value for name, value in os.environ.items() if name not in ("DISPLAY", "MPLBACKEND")}
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        output = subprocess.run([sys.executable, "-c", script], cwd=root, env=env, capture_output=True, text=True,
+                                check=True).stdout
+        self.assertEqual(output.strip(), "")
 
 
 if __name__ == '__main__':
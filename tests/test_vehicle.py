@@ -1,5 +1,7 @@
 import unittest
-from MILP_OOP import Vehicle
+import random
+import numpy as np
+from MILP_OOP import MILP_Model, ScenarioGenerator, Vehicle, VehicleBatch
 
 class TestVehicle(unittest.TestCase):
     def setUp(self):
@@ -24,7 +26,63 @@ class TestVehicle(unittest.TestCase):
         self.assertEqual(default_vehicle.v0, 20)
         self.assertEqual(default_vehicle.t0, default_vehicle.d0/default_vehicle.v0)
 
-    # Add more tests as needed
+    def test_vehicle_batch(self):
+        vehicles = [Vehicle(i) for i in range(8)]
+        batch = VehicleBatch.from_vehicles(vehicles)
+        self.assertEqual(len(batch), 8)
+        self.assertEqual(batch.codes.dtype, np.int8)
+        self.assertEqual(batch.ks.tolist(), [vehicle.k for vehicle in vehicles])
+        back = batch.to_vehicles()
+        self.assertEqual([(v.idx, v.k, v.d0, v.v0, v.t0) for v in back],
+                         [(v.idx, v.k, v.d0, v.v0, v.t0) for v in vehicles])
+        self.assertEqual(len(batch[2:5]), 3)
+        self.assertEqual(batch[3].k, vehicles[3].k)
+
+        # Same t_min and model as the Vehicle list
+        model = MILP_Model("list", vehicles)
+        self.assertTrue(np.allclose(batch.t_min(), [model.compute_t_min(i) for i in range(8)]))
+        from_batch = MILP_Model("batch", batch)
+        for example in (model, from_batch):
+            example.initialize_variables()
+            example.initialize_constraints()
+            example.initialize_objective_function()
+            example.optimize()
+        self.assertAlmostEqual(from_batch.MILP.ObjVal, model.MILP.ObjVal, places=6)
+
+        # The model keeps the batch as arrays: Vehicles are only made when asked for, the batch itself is a copy
+        self.assertIsInstance(from_batch._vehicles, VehicleBatch)
+        self.assertEqual(from_batch.ks.dtype, np.int8)
+        from_batch.update_vehicle_state(0, d0=250)
+        self.assertEqual(batch.d0s[0], vehicles[0].d0)
+        self.assertEqual(from_batch.vehicles[0].d0, 250)
+        self.assertEqual([vehicle.idx for vehicle in from_batch.vehicles], list(range(8)))
+
+    def test_vehicle_batch_arrays(self):
+        n = 100000
+        batch = VehicleBatch(np.arange(n) % 4, np.linspace(20, 500, n), v0=15)
+        self.assertEqual(batch.ks[:4].tolist(), ['North', 'South', 'East', 'West'])
+        self.assertTrue(np.allclose(batch.t0s, batch.d0s / 15))
+        self.assertEqual(batch.vertical.sum(), n // 2)
+        self.assertLess(batch.nbytes, 60 * n)
+        with self.assertRaises(ValueError):
+            VehicleBatch(["North", "Up"], [10, 20])
+
+    def test_scenario_generator(self):
+        state = random.getstate()
+        codes, d0s = ScenarioGenerator(seed=3).spawn(200)
+        self.assertEqual(random.getstate(), state)
+        again = ScenarioGenerator(seed=3).spawn(200)
+        self.assertTrue(np.array_equal(codes, again[0]) and np.array_equal(d0s, again[1]))
+        for code in range(4):
+            lane = np.sort(d0s[codes == code])
+            self.assertGreaterEqual(np.diff(lane).min(), 5 - 1e-9)
+            self.assertTrue(lane.min() >= 5 and lane.max() <= 495)
+        with self.assertRaises(ValueError):
+            ScenarioGenerator(seed=3).spawn(1000)
+
+        batch = ScenarioGenerator(seed=3, d_max=1e6).generate(100000, v0=15)
+        self.assertEqual(len(batch), 100000)
+        self.assertTrue(np.all(batch.v0s == 15))
 
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file